@@ -0,0 +1,3 @@
+"""
+Offline benchmarks for the app; see bench/run_bench.py.
+"""
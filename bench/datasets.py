@@ -0,0 +1,175 @@
+"""
+Synthetic home run datasets for the benchmarks: batters, their player
+directory entries, teams, rosters, games and the home run CSVs, generated
+deterministically from a seed.
+"""
+import io
+import random
+
+import pandas as pd
+
+FIRST_NAMES = [
+    'Aaron', 'Bobby', 'Carlos', 'Dansby', 'Eugenio', 'Freddie', 'Gleyber',
+    'Hunter', 'Ian', 'Jose', 'Kyle', 'Luis', 'Manny', 'Nolan', 'Ozzie',
+    'Pete', 'Rafael', 'Salvador', 'Trea', 'Vladimir', 'Willy', 'Yordan'
+]
+LAST_NAMES = [
+    'Alvarez', 'Betts', 'Correa', 'Devers', 'Edman', 'Freeman', 'Garcia',
+    'Harper', 'Judge', 'Kirk', 'Lindor', 'Machado', 'Naylor', 'Olson',
+    'Perez', 'Ramirez', 'Soto', 'Tucker', 'Urias', 'Votto', 'Witt', 'Yelich'
+]
+HIT_TYPES = ['fly ball', 'line drive']
+FIELDS = ['left field', 'center field', 'right field']
+CSV_FILES = [
+    '2016-mlb-homeruns.csv', '2017-mlb-homeruns.csv',
+    '2024-mlb-homeruns.csv', '2024-postseason-mlb-homeruns.csv'
+]
+# (home runs, batters) per dataset size; medium is about the real dataset
+SIZES = {
+    'small': (2000, 200),
+    'medium': (20000, 1200),
+    'large': (100000, 3000),
+}
+NUM_TEAMS = 30
+PLAYER_ID_BASE = 500000
+GAME_ID_BASE = 700000
+
+
+class SyntheticDataset:
+
+    def __init__(self, size='medium', seed=2025):
+        home_runs, batters = SIZES[size]
+        self.rng = random.Random(seed)
+        self.teams = [{
+            'id': 100 + i,
+            'name': f"Team {i + 1}"
+        } for i in range(NUM_TEAMS)]
+        self.people = self._make_people(batters)
+        self.by_id = {str(person['id']): person for person in self.people}
+        self.games = max(home_runs // 3, 1)
+        self.csv_files = self._make_csv_files(home_runs)
+
+    def _make_people(self, count):
+        names = [f"{first} {last}" for last in LAST_NAMES
+                 for first in FIRST_NAMES]
+        self.rng.shuffle(names)
+        people = []
+        for i in range(count):
+            # Past the unique first/last pairs, tell players apart with a
+            # middle name
+            name = names[i % len(names)]
+            if i >= len(names):
+                first, last = name.split()
+                middle = LAST_NAMES[i // len(names) % len(LAST_NAMES)]
+                name = f"{first} {middle} {last}"
+            team = self.teams[i % NUM_TEAMS]
+            people.append({
+                'id': PLAYER_ID_BASE + i,
+                'fullName': name,
+                'primaryNumber': str(i % 99 + 1),
+                'primaryPosition': {
+                    'name': self.rng.choice(['Outfielder', 'Shortstop',
+                                             'First Base', 'Catcher'])
+                },
+                'currentTeam': dict(team),
+            })
+        return people
+
+    def _make_csv_files(self, count):
+        # A few sluggers hit most of the home runs, as in real seasons
+        weights = [1 / (rank + 1) for rank in range(len(self.people))]
+        batters = self.rng.choices(self.people, weights=weights, k=count)
+        season_counts = {}
+        rows = {file_name: [] for file_name in CSV_FILES}
+        for i, person in enumerate(batters):
+            file_name = CSV_FILES[i % len(CSV_FILES)]
+            key = (file_name, person['id'])
+            season_counts[key] = season_counts.get(key, 0) + 1
+            game_id = GAME_ID_BASE + self.rng.randrange(self.games)
+            rows[file_name].append({
+                'play_id': f"play-{i}",
+                'title': (f"{person['fullName']} homers "
+                          f"({season_counts[key]}) on a "
+                          f"{self.rng.choice(HIT_TYPES)} to "
+                          f"{self.rng.choice(FIELDS)}."),
+                'ExitVelocity': round(self.rng.uniform(95, 118), 1),
+                'HitDistance': round(self.rng.uniform(340, 480)),
+                'LaunchAngle': round(self.rng.uniform(18, 40), 1),
+                'video': (f"https://sporty-clips.mlb.com/"
+                          f"{game_id}-{i}.mp4"),
+            })
+
+        csv_files = {}
+        for file_name, file_rows in rows.items():
+            buffer = io.StringIO()
+            pd.DataFrame(file_rows).to_csv(buffer, index=False)
+            csv_files[file_name] = buffer.getvalue().encode()
+        return csv_files
+
+    def person(self, player_id, with_stats=False):
+        person = self.by_id.get(str(player_id))
+        if person is None:
+            return None
+        person = dict(person)
+        if with_stats:
+            person['stats'] = self._stats(int(player_id))
+        return person
+
+    def _stats(self, player_id):
+        rng = random.Random(player_id)
+        seasons = [{
+            'season': str(season),
+            'team': {'name': 'Team'},
+            'stat': {
+                'gamesPlayed': rng.randrange(20, 162),
+                'homeRuns': rng.randrange(0, 50),
+                'avg': f".{rng.randrange(200, 330)}",
+            }
+        } for season in range(2016, 2027)]
+        return [{
+            'group': {'displayName': 'hitting'},
+            'type': {'displayName': 'career'},
+            'splits': [{'stat': {'homeRuns': sum(
+                split['stat']['homeRuns'] for split in seasons)}}]
+        }, {
+            'group': {'displayName': 'hitting'},
+            'type': {'displayName': 'yearByYear'},
+            'splits': seasons
+        }]
+
+    def roster(self, team_id):
+        return [{
+            'person': {'id': person['id'], 'fullName': person['fullName']}
+        } for person in self.people
+                if str(person['currentTeam']['id']) == str(team_id)]
+
+    def game(self, game_id, endpoint):
+        rng = random.Random(game_id)
+        home, away = rng.sample(self.teams, 2)
+        if endpoint == 'boxscore':
+            return {
+                'teams': {
+                    'home': {'team': home, 'teamStats': {
+                        'batting': {'runs': rng.randrange(10)}}},
+                    'away': {'team': away, 'teamStats': {
+                        'batting': {'runs': rng.randrange(10)}}},
+                }
+            }
+        return {
+            'currentInning': 9,
+            'inningState': 'Bottom',
+            'outs': 3,
+            'balls': 0,
+            'strikes': 0,
+            'offense': {}
+        }
+
+    def schedule(self, game_id):
+        return {
+            'dates': [{
+                'games': [{
+                    'gamePk': game_id,
+                    'status': {'abstractGameState': 'Final'}
+                }]
+            }]
+        }
@@ -0,0 +1,332 @@
+"""
+In-process stand-ins for Firestore, the MLB Stats API (and the GCS home run
+CSVs) and Gemini, each with a configurable latency per call, so the app can
+be benchmarked without credentials or network.
+"""
+import copy
+import datetime
+import json
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+
+class FakeSnapshot:
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocument:
+
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def get(self, transaction=None):
+        self._db.wait_read()
+        with self._db.lock:
+            data = copy.deepcopy(self._db.docs.get(self.path))
+        return FakeSnapshot(self, data)
+
+    def set(self, data, merge=False):
+        self._db.wait_write()
+        self._db.write(self.path, data, merge)
+
+    def update(self, fields):
+        self._db.wait_write()
+        with self._db.lock:
+            if self.path not in self._db.docs:
+                raise KeyError(f"No document to update: {self.path}")
+        self._db.write(self.path, fields, merge=True)
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+
+class FakeQuery:
+
+    def __init__(self, collection, order=None, after=None, limit=None):
+        self._collection = collection
+        self._order = order
+        self._after = after
+        self._limit = limit
+
+    def order_by(self, field, direction='ASCENDING'):
+        return FakeQuery(self._collection, (field, direction), self._after,
+                         self._limit)
+
+    def start_after(self, snapshot):
+        return FakeQuery(self._collection, self._order, snapshot, self._limit)
+
+    def limit(self, count):
+        return FakeQuery(self._collection, self._order, self._after, count)
+
+    def stream(self, transaction=None):
+        snapshots = self._collection.snapshots()
+        if self._order:
+            field, direction = self._order
+            snapshots = [s for s in snapshots if s.get(field) is not None]
+            # Firestore breaks ties by document ID, in the direction of the
+            # last order_by
+            snapshots.sort(key=lambda s: (s.get(field), s.id),
+                           reverse=direction == 'DESCENDING')
+        if self._after is not None:
+            ids = [s.id for s in snapshots]
+            if self._after.id in ids:
+                snapshots = snapshots[ids.index(self._after.id) + 1:]
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        return iter(snapshots)
+
+
+class FakeCollection(FakeQuery):
+
+    def __init__(self, db, path):
+        super().__init__(self)
+        self._db = db
+        self.path = path
+
+    def document(self, document_id):
+        return FakeDocument(self._db, f"{self.path}/{document_id}")
+
+    def snapshots(self):
+        self._db.wait_read()
+        prefix = self.path + '/'
+        with self._db.lock:
+            return [
+                FakeSnapshot(FakeDocument(self._db, path),
+                             copy.deepcopy(data))
+                for path, data in sorted(self._db.docs.items())
+                if path.startswith(prefix) and '/' not in path[len(prefix):]
+            ]
+
+    def on_snapshot(self, callback):
+        self._db.listeners.setdefault(self.path, []).append(callback)
+        callback(self.snapshots(), [], datetime.datetime.now())
+        return self
+
+
+class FakeBatch:
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference.path, data, merge))
+
+    def commit(self):
+        self._db.wait_write()
+        for path, data, merge in self._writes:
+            self._db.write(path, data, merge)
+
+
+class FakeTransaction(FakeBatch):
+
+    def update(self, reference, fields):
+        self._writes.append((reference.path, fields, True))
+
+
+def transactional(fn):
+    """
+    Stands in for firestore.transactional: runs fn holding the database
+    lock, so nothing is written between its reads and its commit.
+    """
+
+    def wrapper(transaction, *args, **kwargs):
+        with transaction._db.lock:
+            result = fn(transaction, *args, **kwargs)
+            transaction.commit()
+        return result
+
+    return wrapper
+
+
+class FakeFirestore:
+    """
+    Dict-backed Firestore client covering what the app uses: documents,
+    subcollections, ordered and limited queries, batches, transactions,
+    snapshot listeners, Increment and SERVER_TIMESTAMP.
+    """
+
+    def __init__(self, read_latency=0.0, write_latency=0.0):
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.docs = {}
+        self.listeners = {}
+        self.lock = threading.RLock()
+        self.reads = self.writes = 0
+
+    def wait_read(self):
+        self.reads += 1
+        if self.read_latency:
+            time.sleep(self.read_latency)
+
+    def wait_write(self):
+        self.writes += 1
+        if self.write_latency:
+            time.sleep(self.write_latency)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def write(self, path, data, merge):
+        from firebase_admin import firestore
+
+        with self.lock:
+            document = dict(self.docs.get(path) or {}) if merge else {}
+            for field, value in data.items():
+                if isinstance(value, firestore.Increment):
+                    document[field] = document.get(field, 0) + value.value
+                elif value is firestore.SERVER_TIMESTAMP:
+                    document[field] = datetime.datetime.now(
+                        datetime.timezone.utc)
+                else:
+                    document[field] = copy.deepcopy(value)
+            self.docs[path] = document
+
+        collection_path = path.rsplit('/', 1)[0]
+        callbacks = self.listeners.get(collection_path, [])
+        if callbacks:
+            snapshots = FakeCollection(self, collection_path).snapshots()
+            for callback in callbacks:
+                callback(snapshots, [], datetime.datetime.now())
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200, payload=None, content=None,
+                 headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.content = content if content is not None else json.dumps(
+            payload).encode()
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        return self._payload if self._payload is not None else json.loads(
+            self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error",
+                                                response=self)
+
+
+class FakeStatsApi:
+    """
+    Stands in for the shared requests session: answers Stats API and home
+    run CSV URLs from a synthetic dataset (see bench.datasets) after
+    sleeping for the configured latency.
+    """
+
+    def __init__(self, dataset, latency=0.0, csv_latency=0.0):
+        self.dataset = dataset
+        self.latency = latency
+        self.csv_latency = csv_latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query))
+        query.update(params or {})
+        with self._lock:
+            self.calls += 1
+
+        if parts.hostname == 'storage.googleapis.com':
+            time.sleep(self.csv_latency)
+            return self._csv(parts.path, headers or {})
+        time.sleep(self.latency)
+
+        path = parts.path.split('/api/v1/', 1)[-1].strip('/').split('/')
+        dataset = self.dataset
+        if path == ['sports', '1', 'players']:
+            return FakeResponse(payload={'people': dataset.people})
+        if path[0] == 'people' and len(path) == 2:
+            person = dataset.person(path[1],
+                                    'stats' in query.get('hydrate', ''))
+            if person is None:
+                return FakeResponse(404, {'message': 'Not found'})
+            return FakeResponse(payload={'people': [person]})
+        if path == ['teams']:
+            return FakeResponse(payload={'teams': dataset.teams})
+        if path[0] == 'teams' and path[-1] == 'roster':
+            return FakeResponse(payload={'roster': dataset.roster(path[1])})
+        if path[0] == 'game' and len(path) == 3:
+            return FakeResponse(payload=dataset.game(path[1], path[2]))
+        if path == ['schedule']:
+            return FakeResponse(payload=dataset.schedule(query.get('gamePk')))
+        return FakeResponse(404, {'message': f"No fake for {url}"})
+
+    def _csv(self, path, headers):
+        file_name = path.rsplit('/', 1)[-1]
+        content = self.dataset.csv_files.get(file_name)
+        if content is None:
+            return FakeResponse(404, content=b'')
+        etag = f'"{hash(content) & 0xffffffff:x}"'
+        if headers.get('If-None-Match') == etag:
+            return FakeResponse(304, content=b'', headers={'ETag': etag})
+        return FakeResponse(content=content, headers={'ETag': etag})
+
+
+class FakeChunk:
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGemini:
+    """
+    Stands in for a GenerativeModel. Returns a canned analysis after the
+    configured latency, spread over chunks when streaming.
+    """
+
+    ANALYSIS = ("Technical Analysis: The exit velocity and launch angle are "
+                "in the sweet spot for a home run.\n"
+                "League Comparison: The distance is above the MLB average.\n"
+                "Game Context: The home run changed the game's momentum.\n")
+
+    def __init__(self, latency=0.0, chunks=6):
+        self.latency = latency
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if not stream:
+            time.sleep(self.latency)
+            return FakeChunk(self.ANALYSIS)
+        return self._stream()
+
+    def _stream(self):
+        size = -(-len(self.ANALYSIS) // self.chunks)
+        for start in range(0, len(self.ANALYSIS), size):
+            time.sleep(self.latency / self.chunks)
+            yield FakeChunk(self.ANALYSIS[start:start + size])
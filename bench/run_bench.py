@@ -0,0 +1,255 @@
+"""
+Benchmarks the app's routes offline, against the fakes in bench.fakes and a
+synthetic dataset from bench.datasets.
+
+    python -m bench.run_bench --size medium --scenario video_paging \\
+        --concurrency 8 --requests 500 --stats-latency 0.05
+
+Reports throughput and p50/p95/p99 latency per route, plus how many calls
+reached each fake backend.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.datasets import SIZES, SyntheticDataset
+from bench.fakes import FakeFirestore, FakeGemini, FakeStatsApi, transactional
+
+SCENARIOS = [
+    'index', 'add_player', 'vote_storm', 'video_paging', 'analysis', 'stats'
+]
+
+
+def load_app(dataset, args):
+    """
+    Installs the fakes and imports main, which then starts up exactly as in
+    production: loading the home runs, connecting the caches and starting
+    the background threads. Returns once every startup step is done.
+    """
+    os.environ.setdefault('FIREBASE_CREDENTIALS', '{}')
+    os.environ.setdefault('GEMINI_API_KEY', 'bench')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if args.http_store:
+        # Upstream responses come from a session recorded with
+        # HTTP_STORE_MODE=record instead of the fake Stats API
+        os.environ['HTTP_STORE_MODE'] = 'replay'
+        os.environ['HTTP_STORE_PATH'] = args.http_store
+    else:
+        # The fakes answer every request; don't read or fill the HTTP store
+        os.environ.setdefault('HTTP_STORE_MODE', 'off')
+    os.environ['HOME_RUNS_SNAPSHOT'] = os.path.join(tempfile.mkdtemp(),
+                                                    'home_runs.feather')
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    db = FakeFirestore(args.firestore_latency, args.firestore_latency)
+    credentials.Certificate = lambda *a, **k: None
+    firebase_admin.initialize_app = lambda *a, **k: None
+    firestore.client = lambda *a, **k: db
+    firestore.transactional = transactional
+
+    import http_utils
+    stats_api = FakeStatsApi(dataset, args.stats_latency, args.csv_latency)
+    http_utils.session = stats_api
+
+    import gemini_utils
+    gemini = FakeGemini(args.gemini_latency)
+    gemini_utils._models[False] = gemini
+
+    start = time.perf_counter()
+    import main
+    boot = time.perf_counter() - start
+    import startup_utils
+    startup_utils.wait_until_ready()
+    startup = time.perf_counter() - start
+    return main, {
+        'firestore': db,
+        'stats_api': stats_api,
+        'gemini': gemini,
+        'boot_seconds': boot,
+        'startup_seconds': startup
+    }
+
+
+def seed_favorites(db, dataset, count):
+    for i, person in enumerate(dataset.people[:count]):
+        db.collection('favorite_players').document(str(person['id'])).set({
+            'id': str(person['id']),
+            'name': person['fullName'],
+            'team': person['currentTeam']['name'],
+            'position': person['primaryPosition']['name'],
+            'primaryNumber': person['primaryNumber'],
+            'votes': count - i,
+            'votes_base': count - i
+        })
+
+
+def scenario_requests(scenario, dataset, rng):
+    """
+    Returns (route, method, path, data) for one request of a scenario.
+    """
+    # Players with home runs, the heavy hitters first
+    hitters = dataset.people[:50]
+    if scenario == 'index':
+        return 'GET /', 'GET', '/', None
+    if scenario == 'add_player':
+        person = rng.choice(dataset.people)
+        return 'POST /', 'POST', '/', {'player_name': person['fullName']}
+    if scenario == 'vote_storm':
+        # Most votes go to a handful of players
+        person = hitters[min(int(rng.expovariate(1.0)), len(hitters) - 1)]
+        return 'GET /vote', 'GET', f"/vote/{person['id']}", None
+    if scenario == 'video_paging':
+        person = rng.choice(hitters)
+        return ('GET /video', 'GET',
+                f"/video/{person['id']}/{rng.randrange(10)}", None)
+    if scenario == 'analysis':
+        person = rng.choice(hitters)
+        return ('GET /api/analysis', 'GET',
+                f"/api/analysis/{person['id']}/{rng.randrange(10)}", None)
+    if scenario == 'stats':
+        person = rng.choice(hitters)
+        return 'GET /stats', 'GET', f"/stats/{person['id']}", None
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def run_scenario(app, scenario, dataset, requests, concurrency, seed):
+    """
+    Sends requests from concurrency worker threads, each with its own test
+    client. Returns ({route: [latencies]}, {route: error count}, elapsed
+    seconds).
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker(worker_id):
+        client = app.test_client()
+        rng = random.Random(seed + worker_id)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            route, method, path, data = scenario_requests(
+                scenario, dataset, rng)
+            start = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            response.get_data()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[route].append(elapsed)
+                if response.status_code >= 500:
+                    errors[route] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(scenario, latencies, errors, elapsed):
+    rows = []
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        rows.append({
+            'scenario': scenario,
+            'route': route,
+            'requests': len(values),
+            'errors': errors.get(route, 0),
+            'throughput': len(values) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+        })
+    return rows
+
+
+def print_table(rows):
+    print(f"{'scenario':<14}{'route':<18}{'reqs':>7}{'errs':>6}"
+          f"{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for row in rows:
+        print(f"{row['scenario']:<14}{row['route']:<18}{row['requests']:>7}"
+              f"{row['errors']:>6}{row['throughput']:>9.1f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the app's routes against in-process fakes")
+    parser.add_argument('--size', choices=list(SIZES), default='medium')
+    parser.add_argument('--scenario',
+                        choices=SCENARIOS + ['all'],
+                        default='all')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--favorites',
+                        type=int,
+                        default=100,
+                        help="players seeded into favorite_players")
+    parser.add_argument('--firestore-latency', type=float, default=0.005)
+    parser.add_argument('--stats-latency', type=float, default=0.05)
+    parser.add_argument('--csv-latency', type=float, default=0.0)
+    parser.add_argument('--gemini-latency', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--http-store',
+                        metavar='PATH',
+                        help="replay Stats API and CSV responses from an "
+                        "HTTP store recorded with HTTP_STORE_MODE=record")
+    parser.add_argument('--json',
+                        metavar='PATH',
+                        help="also write the results to a JSON file")
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(args.size, args.seed)
+    main, backends = load_app(dataset, args)
+    seed_favorites(backends['firestore'], dataset, args.favorites)
+    print(f"Booted app in {backends['boot_seconds'] * 1000:.0f}ms, ready on "
+          f"a {args.size} dataset in {backends['startup_seconds']:.2f}s")
+
+    scenarios = SCENARIOS if args.scenario == 'all' else [args.scenario]
+    rows = []
+    for scenario in scenarios:
+        latencies, errors, elapsed = run_scenario(main.app, scenario, dataset,
+                                                  args.requests,
+                                                  args.concurrency, args.seed)
+        rows.extend(summarize(scenario, latencies, errors, elapsed))
+
+    print_table(rows)
+    print(f"Backend calls: firestore reads={backends['firestore'].reads} "
+          f"writes={backends['firestore'].writes}, "
+          f"stats_api={backends['stats_api'].calls}, "
+          f"gemini={backends['gemini'].calls}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(
+                {
+                    'args': vars(args),
+                    'boot_seconds': backends['boot_seconds'],
+                    'startup_seconds': backends['startup_seconds'],
+                    'results': rows
+                },
+                f,
+                indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
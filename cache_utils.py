@@ -0,0 +1,246 @@
+import copy
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metrics_utils import span
+
+logger = logging.getLogger(__name__)
+
+# Seconds an entry stays fresh, per Firestore collection. None means the
+# cached data never goes stale.
+CACHE_TTLS = {
+    'player_cache': 86400,
+    'roster_cache': 43200,
+    # Team and position saved with a player's favorite_players entry
+    'favorite_team': 43200,
+    # Freshness of the current season is tracked by stats_utils
+    'player_stats': None,
+    'video_cache': None,
+    'analysis_cache': None,
+    'game_context': None,
+}
+# How long a "not found" answer is remembered
+NEGATIVE_TTL = int(os.environ.get('CACHE_NEGATIVE_TTL', 3600))
+MEMORY_CACHE_SIZE = int(os.environ.get('MEMORY_CACHE_SIZE', 2048))
+
+# Returned by cache_get for keys cached as not found
+NOT_FOUND = object()
+
+_db = None
+# (namespace, key) -> (expires_at, value), least recently used first
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_stats = defaultdict(Counter)
+# key -> Future of the call currently computing it
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def init_cache(db):
+    """
+    Sets the Firestore client used as the second cache tier.
+    """
+    global _db
+    _db = db
+
+
+def _remember(namespace, key, value, expires_at):
+    with _memory_lock:
+        _memory[(namespace, key)] = (expires_at, value)
+        _memory.move_to_end((namespace, key))
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _expires_at(namespace, cached_at, missing=False):
+    ttl = NEGATIVE_TTL if missing else CACHE_TTLS.get(namespace)
+    if ttl is None:
+        return None
+    if cached_at is None:
+        return time.time() + ttl
+    return cached_at.timestamp() + ttl
+
+
+def cache_get(namespace, key):
+    """
+    Looks a key up in the in-process LRU, then in the namespace's Firestore
+    collection. Returns a copy of the cached dict, NOT_FOUND for a cached
+    negative answer, or None on a miss or expired entry.
+    """
+    key = str(key)
+    now = time.time()
+
+    with _memory_lock:
+        entry = _memory.get((namespace, key))
+        if entry is not None:
+            if entry[0] is None or entry[0] > now:
+                _memory.move_to_end((namespace, key))
+            else:
+                del _memory[(namespace, key)]
+                entry = None
+    if entry is not None:
+        _stats[namespace]['memory_hits'] += 1
+        value = entry[1]
+        return value if value is NOT_FOUND else copy.deepcopy(value)
+
+    if _db is None:
+        _stats[namespace]['misses'] += 1
+        return None
+
+    try:
+        with span('firestore', f'{namespace}.get'):
+            doc = _db.collection(namespace).document(key).get()
+    except Exception as e:
+        logger.error("Error reading %s cache: %s", namespace, e)
+        doc = None
+
+    if doc is None or not doc.exists:
+        _stats[namespace]['misses'] += 1
+        return None
+
+    data = doc.to_dict()
+    missing = data.get('missing', False)
+    expires_at = _expires_at(namespace, data.get('cached_at'), missing)
+    if expires_at is not None and expires_at <= now:
+        _stats[namespace]['expired'] += 1
+        _stats[namespace]['misses'] += 1
+        return None
+
+    _stats[namespace]['firestore_hits'] += 1
+    value = NOT_FOUND if missing else data
+    _remember(namespace, key, value, expires_at)
+    return value if value is NOT_FOUND else copy.deepcopy(value)
+
+
+def cache_set(namespace, key, data):
+    """
+    Stores a dict in both cache tiers, stamped with cached_at.
+    """
+    key = str(key)
+    _remember(namespace, key, copy.deepcopy(data),
+              _expires_at(namespace, None))
+    if _db is None:
+        return
+    from firebase_admin import firestore
+
+    try:
+        with span('firestore', f'{namespace}.set'):
+            _db.collection(namespace).document(key).set(
+                dict(data, cached_at=firestore.SERVER_TIMESTAMP))
+    except Exception as e:
+        logger.error("Error writing %s cache: %s", namespace, e)
+
+
+def cache_update(namespace, key, fields):
+    """
+    Updates some fields of a cached dict in both tiers without rewriting the
+    rest of the Firestore document.
+    """
+    key = str(key)
+    with _memory_lock:
+        entry = _memory.get((namespace, key))
+        if entry is not None and entry[1] is not NOT_FOUND:
+            entry[1].update(copy.deepcopy(fields))
+    if _db is None:
+        return
+    try:
+        with span('firestore', f'{namespace}.update'):
+            _db.collection(namespace).document(key).update(fields)
+    except Exception as e:
+        logger.error("Error updating %s cache: %s", namespace, e)
+
+
+def cache_set_missing(namespace, key):
+    """
+    Remembers that a key doesn't exist upstream, for NEGATIVE_TTL seconds.
+    """
+    key = str(key)
+    _remember(namespace, key, NOT_FOUND, _expires_at(namespace, None, True))
+    if _db is None:
+        return
+    from firebase_admin import firestore
+
+    try:
+        with span('firestore', f'{namespace}.set'):
+            _db.collection(namespace).document(key).set({
+                'missing': True,
+                'cached_at': firestore.SERVER_TIMESTAMP
+            })
+    except Exception as e:
+        logger.error("Error writing %s cache: %s", namespace, e)
+
+
+def cache_stats():
+    """
+    Returns hit/miss counters per namespace.
+    """
+    return {namespace: dict(counts) for namespace, counts in _stats.items()}
+
+
+def cache_counters():
+    """
+    Returns the cache counters in the shape metrics_utils exports.
+    """
+    return {
+        ('cache_events_total', (('event', event), ('namespace', namespace))):
+        count
+        for namespace, counts in cache_stats().items()
+        for event, count in counts.items()
+    }
+
+
+@contextmanager
+def flight(key):
+    """
+    Claims the in-flight entry for a key, for callers that can't wrap their
+    work in a single call, such as a generator streaming its result.
+    Yields (future, leader): a leader does the work and sets the future's
+    result; everyone else waits on the future. A leader that stops without
+    a result fails the future, so waiters never hang.
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if not leader:
+        _stats['single_flight']['coalesced'] += 1
+        yield future, False
+        return
+
+    try:
+        yield future, True
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+        raise
+    finally:
+        # Anything else (a GeneratorExit when a streaming leader's client
+        # disconnects) belongs to the leader alone; waiters get the
+        # RuntimeError below rather than an exception they can't handle
+        if not future.done():
+            future.set_exception(
+                RuntimeError(f"In-flight call for {key} ended without a "
+                             "result"))
+        with _in_flight_lock:
+            del _in_flight[key]
+
+
+def single_flight(key, fn, *args):
+    """
+    Calls fn(*args), unless a call for the same key is already running in
+    this process, in which case waits for that call and returns its result
+    (or raises its exception) instead.
+    """
+    with flight(key) as (future, leader):
+        if not leader:
+            return future.result()
+        result = fn(*args)
+        future.set_result(result)
+        return result
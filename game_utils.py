@@ -0,0 +1,125 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import cache_get, cache_set
+from http_utils import STATS_API_URL, http_get
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_WORKERS = 8
+
+# Contexts of finished games by game ID. They never change, so once filled
+# an entry is kept for the life of the process.
+_game_contexts = {}
+_game_contexts_lock = threading.Lock()
+
+
+def game_id_from_video(video_url):
+    return video_url.split('/')[-1].split('-')[0] if video_url else ''
+
+
+def default_game_context():
+    return {
+        'home_team': 'Home Team',
+        'away_team': 'Away Team',
+        'home_score': 'N/A',
+        'away_score': 'N/A',
+    }
+
+
+def fetch_game_context(game_id):
+    """
+    Builds a game's context (teams and final score) from its boxscore.
+    Returns (context, is_final). The linescore isn't used: it gives the
+    state at the end of the game, not when a home run was hit.
+    """
+    context = default_game_context()
+
+    # Only finished games can be cached for good. Checked first, so the
+    # HTTP store knows the game is over when the boxscore is fetched
+    response = http_get(f"{STATS_API_URL}/schedule", params={'gamePk': game_id})
+    games = [
+        game for date in response.json().get('dates', [])
+        for game in date.get('games', [])
+    ] if response.status_code == 200 else []
+    is_final = bool(games) and games[0].get('status', {}).get(
+        'abstractGameState') == 'Final'
+
+    # Get team names and scores from the boxscore endpoint
+    response = http_get(f"{STATS_API_URL}/game/{game_id}/boxscore")
+    teams_data = response.json() if response.status_code == 200 else {}
+    home_team_data = teams_data.get('teams', {}).get('home', {})
+    away_team_data = teams_data.get('teams', {}).get('away', {})
+    context['home_team'] = home_team_data.get('team', {}).get('name', 'Home Team')
+    context['away_team'] = away_team_data.get('team', {}).get('name', 'Away Team')
+    context['home_score'] = home_team_data.get('teamStats', {}).get(
+        'batting', {}).get('runs', 'N/A')
+    context['away_score'] = away_team_data.get('teamStats', {}).get(
+        'batting', {}).get('runs', 'N/A')
+    return context, is_final
+
+
+def get_game_context(game_id):
+    """
+    Returns a game's context, from memory, then the game_context Firestore
+    collection, then the Stats API. Finished games are stored in both caches
+    on first use. Falls back to default values if the game can't be fetched.
+    """
+    if not game_id:
+        return default_game_context()
+
+    context = _game_contexts.get(game_id)
+    if context is not None:
+        return context
+
+    context = cache_get('game_context', game_id)
+    if context:
+        context.pop('cached_at', None)
+    else:
+        try:
+            context, is_final = fetch_game_context(game_id)
+        except Exception as e:
+            logger.error("Error fetching game data for %s: %s", game_id, e)
+            return default_game_context()
+        if not is_final:
+            return context
+        cache_set('game_context', game_id, context)
+
+    with _game_contexts_lock:
+        _game_contexts[game_id] = context
+    return context
+
+
+def prefetch_game_contexts(game_ids, workers=PREFETCH_WORKERS):
+    """
+    Resolves the context of every given game with a pool of workers, so
+    later prompt building doesn't have to wait on the Stats API.
+    """
+    game_ids = sorted({game_id for game_id in game_ids if game_id} -
+                      _game_contexts.keys())
+    logger.info("Prefetching context for %s games", len(game_ids))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, _ in enumerate(pool.map(get_game_context, game_ids), 1):
+            if i % 100 == 0:
+                logger.info("Prefetched %s/%s games", i, len(game_ids))
+    return len(game_ids)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import main  # noqa: F401 (loads the dataset and connects the cache)
+    from home_run_utils import get_home_runs_df
+    from startup_utils import wait_until_ready
+
+    parser = argparse.ArgumentParser(
+        description="Prefetch the context of every game in the home run "
+        "dataset into the game_context cache")
+    parser.add_argument('--workers', type=int, default=PREFETCH_WORKERS)
+    args = parser.parse_args()
+
+    wait_until_ready('firebase', 'home_runs')
+    videos = get_home_runs_df()['video'].fillna('')
+    prefetch_game_contexts(videos.map(game_id_from_video),
+                           workers=args.workers)
@@ -1,44 +1,73 @@
+import logging
 import os
+import threading
+
 import requests
 
+from game_utils import game_id_from_video, get_game_context
+from http_utils import http_get
+from log_utils import sampled
+from metrics_utils import span
+
+GEMINI_MODEL_NAME = "gemini-2.0-flash-exp"
+GEMINI_MULTIMODAL_MODEL_NAME = "gemini-1.5-flash"
+
+logger = logging.getLogger(__name__)
+
+# GenerativeModel instances by multimodal flag, shared by all requests
+_models = {}
+_models_lock = threading.Lock()
+
 
 def init_gemini(multimodal=False):
-    print("\n=== Initializing Gemini ===")
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY not found in environment variables")
-        return None
-    print("API key found")
+    """
+    Returns the process-wide Gemini model for the given mode, configuring
+    the client and creating the model on first use only.
+    """
+    model = _models.get(multimodal)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        if multimodal in _models:
+            return _models[multimodal]
+
+        logger.info("Initializing Gemini")
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.error("GEMINI_API_KEY not found in environment variables")
+            return None
 
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=api_key)
-    except ImportError as e:
-        print(f"Error importing google.generativeai: {e}")
-        return None
+        try:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+        except ImportError as e:
+            logger.error("Error importing google.generativeai: %s", e)
+            return None
 
-    if multimodal:
-        generation_config = {
-            "temperature": 1,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-            "response_mime_type": "text/plain",
-        }
-        model_name = "gemini-1.5-flash"
-    else:
-        generation_config = {
-            "temperature": 0.7,
-            "top_p": 0.8,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
-        model_name = "gemini-2.0-flash-exp"
+        if multimodal:
+            generation_config = {
+                "temperature": 1,
+                "top_p": 0.95,
+                "top_k": 40,
+                "max_output_tokens": 8192,
+                "response_mime_type": "text/plain",
+            }
+            model_name = GEMINI_MULTIMODAL_MODEL_NAME
+        else:
+            generation_config = {
+                "temperature": 0.7,
+                "top_p": 0.8,
+                "top_k": 40,
+                "max_output_tokens": 2048,
+            }
+            model_name = GEMINI_MODEL_NAME
 
-    return genai.GenerativeModel(
-        model_name=model_name,
-        generation_config=generation_config,
-    )
+        _models[multimodal] = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config,
+        )
+        return _models[multimodal]
 
 
 def upload_to_gemini(path, mime_type=None):
@@ -47,7 +76,7 @@ def upload_to_gemini(path, mime_type=None):
     """
     import google.generativeai as genai
     file = genai.upload_file(path, mime_type=mime_type)
-    print(f"Uploaded file '{file.display_name}' as: {file.uri}")
+    logger.info("Uploaded file '%s' as: %s", file.display_name, file.uri)
     return file
 
 
@@ -64,96 +93,37 @@ def get_player_info(player_id, season=None):
         if season:
             params['season'] = season
 
-        response = requests.get(url, params=params)
+        response = http_get(url, params=params)
         if response.status_code == 404:
-            print(f"Player ID {player_id} not found")
+            logger.info("Player ID %s not found", player_id)
             return None
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching player information: {e}")
+        logger.error("Error fetching player information: %s", e)
         return None
 
 
 def analyze_video(player_name, homer_data):
-    import logging
-    import sys
-
-    # Configure logging
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler('video_analysis.log')
-        ]
-    )
-
     try:
-        logging.info("\n=== Starting Video Analysis ===")
-        debug_print(f"Player Name: {player_name}")
-        debug_print(f"Homer Data Type: {type(homer_data)}")
-        debug_print(f"Homer Data Content: {homer_data}")
+        logger.debug("Starting video analysis for %s", player_name)
+        if logger.isEnabledFor(logging.DEBUG) and sampled():
+            logger.debug("Home run data", extra={'homer': homer_data})
 
-        # Initialize Gemini model
-        print("\n=== Initializing Gemini Model ===")
         model = init_gemini()
         if not model:
-            print("Error: Failed to initialize Gemini model")
+            logger.error("Failed to initialize Gemini model")
             return {
                 'text': "Error: Could not initialize Gemini model - check GEMINI_API_KEY",
+                'error': True,
                 'metrics': {
                     'exit_velocity': 0,
                     'estimated_distance': 0,
                     'launch_angle': 0
                 }
             }
-        print("Gemini model initialized successfully")
-
-        video_url = homer_data.get('video', '')
-        game_id = video_url.split('/')[-1].split('-')[0] if video_url else ''
-
-        # Initialize default values
-        home_team = 'Home Team'
-        away_team = 'Away Team'
-        home_score = 'N/A'
-        away_score = 'N/A'
-        inning = 'N/A'
-        inning_state = ''
-        inning_half = 'N/A'
-        outs = 'N/A'
-        count = 'N/A'
-        base_situation = 'unknown'
-
-        # Get detailed game data from MLB Stats API
-        game_data = {}
-        try:
-            # Get complete game data from boxscore endpoint
-            boxscore_url = f"https://statsapi.mlb.com/api/v1/game/{game_id}/boxscore"
-            response = requests.get(boxscore_url)
-            response.raise_for_status()
-            game_data = response.json()
-
-            home_team = game_data.get('teams', {}).get('home', {}).get('team', {}).get('name', 'Home Team')
-            away_team = game_data.get('teams', {}).get('away', {}).get('team', {}).get('name', 'Away Team')
-            home_score = game_data.get('teams', {}).get('home', {}).get('score', 'N/A')
-            away_score = game_data.get('teams', {}).get('away', {}).get('score', 'N/A')
-
-            # Extract inning information (simplified example)
-            linescore = game_data.get('linescore', {})
-            inning = linescore.get('currentInning', 'N/A')
-            inning_half = linescore.get('inningHalf', 'N/A')
-            outs = linescore.get('outs', 'N/A')
-
-            #Example of count data, needs adaptation based on actual data structure
-            count = linescore.get('balls', 'N/A') + '-' + linescore.get('strikes','N/A')
-
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching game information: {e}")
-        except Exception as e:
-            print(f"Error processing game data: {e}")
 
+        game = get_game_context(game_id_from_video(homer_data.get('video', '')))
 
         # Create analysis with metrics
         metrics = {
@@ -173,14 +143,10 @@ def analyze_video(player_name, homer_data):
         Description: {homer_data.get('title', 'N/A')}
 
         Game Context:
-        Home Team: {home_team}
-        Away Team: {away_team}
-        Home Score: {home_score}
-        Away Score: {away_score}
-        Inning: {inning}
-        Inning Half: {inning_half}
-        Outs: {outs}
-        Count: {count}
+        Home Team: {game['home_team']}
+        Away Team: {game['away_team']}
+        Home Score: {game['home_score']}
+        Away Score: {game['away_score']}
 
         Please analyze:
         The technical aspects of the home run (exit velocity, launch angle, distance)
@@ -189,30 +155,25 @@ def analyze_video(player_name, homer_data):
         """
 
         try:
-            logging.info("\n=== Generating Analysis ===")
-            logging.info("Sending prompt to Gemini...")
-            logging.info("\n=== Sending Prompt to Gemini ===")
-            logging.info(f"Prompt length: {len(prompt)}")
-            logging.info("\n=== Sending Prompt ===")
-            logging.info(f"Prompt:\n{prompt}")
-            response = model.generate_content(prompt)
-            logging.info("\n=== Response Received ===")
-            logging.info(f"Raw Response: {response}")
+            logger.debug("Sending prompt to Gemini",
+                         extra={'prompt_length': len(prompt)})
+            if logger.isEnabledFor(logging.DEBUG) and sampled():
+                logger.debug("Gemini prompt", extra={'prompt': prompt})
+            with span('gemini', 'generate'):
+                response = model.generate_content(prompt)
             analysis_text = response.text
-            debug_print(f"Analysis text length: {len(analysis_text)}")
-            debug_print("Analysis content preview:", analysis_text[:200] + "...")
-            debug_print("\n=== Analysis Complete ===")
+            logger.debug("Analysis complete",
+                         extra={'analysis_length': len(analysis_text)})
+            if logger.isEnabledFor(logging.DEBUG) and sampled():
+                logger.debug("Gemini response",
+                             extra={'response': str(response)})
 
             return {'text': analysis_text, 'metrics': metrics}
         except Exception as e:
-            import traceback
-            print("\n=== Analysis Error ===")
-            print(f"Error Type: {type(e).__name__}")
-            print(f"Error Message: {str(e)}")
-            print("Traceback:")
-            traceback.print_exc()
+            logger.exception("Error generating analysis")
             return {
                 'text': f"Error analyzing video: {str(e)}",
+                'error': True,
                 'metrics': {
                     'exit_velocity': 0,
                     'estimated_distance': 0,
@@ -220,9 +181,10 @@ def analyze_video(player_name, homer_data):
                 }
             }
     except Exception as e:
-        print(f"An unexpected error occurred in analyze_video: {e}")
+        logger.error("An unexpected error occurred in analyze_video: %s", e)
         return {
                 'text': f"An unexpected error occurred: {str(e)}",
+                'error': True,
                 'metrics': {
                     'exit_velocity': 0,
                     'estimated_distance': 0,
@@ -233,39 +195,13 @@ def analyze_video(player_name, homer_data):
 
 def get_all_home_runs(player_name):
     """
-    Get all home runs for a player.
+    Get all home runs for a player from the precomputed player index.
     """
     try:
-        from main import home_runs_df
-        clean_player_name = player_name.lower().strip()
-        names = clean_player_name.split()
-        last_name = names[-1] if names else ""
-        first_name = names[0] if names else ""
-
-        # Convert title column to string type and handle NaN values
-        home_runs_df['title'] = home_runs_df['title'].astype(str)
-
-        # Look for titles that contain "homers" or "home run" after the player name
-        homer_pattern = f"({clean_player_name.lower()}).*?(homers|home run)"
-        player_home_runs = home_runs_df[
-            home_runs_df['title'].str.lower().str.match(homer_pattern,
-                                                        case=False)]
-
-        # If no matches, try matching last name and first name separately
-        if player_home_runs.empty and last_name and first_name:
-            player_home_runs = home_runs_df[
-                home_runs_df['title'].str.lower().str.contains(last_name,
-                                                               case=False)
-                & home_runs_df['title'].str.lower().str.contains(first_name,
-                                                                 case=False)]
-
-        if not player_home_runs.empty:
-            return player_home_runs[[
-                'title', 'video', 'ExitVelocity', 'HitDistance', 'LaunchAngle'
-            ]].to_dict('records')
-        return []
+        from home_run_utils import find_home_runs
+        return find_home_runs(player_name)
     except Exception as e:
-        print(f"Error finding home runs: {e}")
+        logger.error("Error finding home runs: %s", e)
         return []
 
 
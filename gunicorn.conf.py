@@ -0,0 +1,45 @@
+"""
+gunicorn settings, read automatically from the working directory.
+
+The app is imported once in the master and the home run dataset loaded
+there before the workers are forked, so all workers share one copy of it
+instead of each building its own. The string columns live in a memory map
+of the snapshot (see home_run_utils.py), which stays shared; the rest is
+shared copy-on-write. Everything that needs threads or connections
+(Firebase, the refresher, the vote writer, the leaderboard listener) is
+started in each worker after the fork.
+
+Metrics are kept per worker; each one writes them to METRICS_DIR so that
+/metrics, whichever worker serves it, reports the totals of all of them.
+"""
+import gc
+import os
+import tempfile
+
+preload_app = True
+raw_env = [
+    # Tells startup_utils to leave the startup steps to post_fork
+    'STARTUP_DEFERRED=1',
+    'METRICS_DIR=' +
+    (os.environ.get('METRICS_DIR') or tempfile.mkdtemp(prefix='metrics-')),
+]
+
+
+def on_starting(server):
+    from metrics_utils import clear_metrics_dir
+    clear_metrics_dir()
+    import main
+    main.preload()
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach, so its
+    # bookkeeping writes don't copy those pages into every worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from metrics_utils import start_metrics_writer
+    from startup_utils import start_deferred
+    start_deferred()
+    start_metrics_writer()
@@ -0,0 +1,622 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import string
+import threading
+import time
+import unicodedata
+
+from http_utils import http_get
+from metrics_utils import timed
+
+logger = logging.getLogger(__name__)
+
+# Load multiple home run datasets
+CSV_URLS = [
+    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2016-mlb-homeruns.csv",
+    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2017-mlb-homeruns.csv",
+    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2024-mlb-homeruns.csv",
+    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2024-postseason-mlb-homeruns.csv",
+]
+
+# Local Arrow snapshot of the concatenated CSVs, so startup doesn't have to
+# download and parse them. The dataset is always served from a memory map of
+# it, so gunicorn workers share one copy of the string columns through the
+# page cache. A snapshot doesn't expire by age: it is served until the
+# refresher's conditional requests with its stored validators find that the
+# CSVs changed. Bump SNAPSHOT_VERSION whenever the frame built by
+# load_home_runs_from_csv changes shape.
+SNAPSHOT_VERSION = 5
+SNAPSHOT_PATH = os.environ.get('HOME_RUNS_SNAPSHOT',
+                               os.path.join('data', 'home_runs.feather'))
+# How often the background refresher polls the CSVs for changes
+REFRESH_INTERVAL = int(os.environ.get('HOME_RUNS_REFRESH_INTERVAL', 3600))
+# Minimum seconds between two refreshes, however often one is requested
+MIN_REFRESH_INTERVAL = int(
+    os.environ.get('HOME_RUNS_MIN_REFRESH_INTERVAL', 300))
+
+# Columns read from the CSVs and their types; any other column in the files
+# is dropped while parsing. 'string' columns are Arrow-backed when pyarrow
+# is installed.
+CSV_SCHEMA = {
+    'title': 'string',
+    'video': 'string',
+    'ExitVelocity': 'float32',
+    'HitDistance': 'float32',
+    'LaunchAngle': 'float32',
+}
+# Columns derived while loading, see read_home_run_csv and
+# add_home_run_metadata
+DERIVED_SCHEMA = {
+    'season_year': 'category',
+    'is_postseason': 'bool',
+    'hr_number': 'string',
+    'is_inside_park': 'bool',
+    'home_run_id': 'string',
+}
+HOME_RUN_SCHEMA = {**CSV_SCHEMA, **DERIVED_SCHEMA}
+HOME_RUN_COLUMNS = list(HOME_RUN_SCHEMA)
+FLOAT_COLUMNS = [
+    column for column, kind in CSV_SCHEMA.items() if kind == 'float32'
+]
+# float32 only approximates the CSVs' decimal values; rows handed out are
+# rounded back to this many places
+FLOAT_DECIMALS = 2
+# Ways a title can give the batter's season home run count, in priority order
+HR_NUMBER_PATTERNS = [
+    r'homers?\s*\((\d+)\)',
+    r'\((\d+)\)\s*on a',
+    r'home run (?:no\.|number|#)\s*(\d+)',
+    r'(\d+)(?:th|st|nd|rd)\s+home run',
+]
+NAME_SUFFIXES = ('jr', 'sr', 'ii', 'iii', 'iv')
+# Capitalized words that end the batter's name in a title ("Mike Trout HR
+# (3)", "Shohei Ohtani Grand Slam"), compared after normalize_name
+TITLE_STOP_WORDS = {
+    'hr', 'hrs', 'homer', 'homers', 'home', 'grand', 'solo', 'walk-off',
+    'walkoff', 'two-run', 'three-run', '2-run', '3-run', 'go-ahead', 'vs',
+    'and', 'with'
+}
+
+# Current dataset version: the frame, its player indexes and the HTTP
+# validators of the CSVs it was built from. Never mutated; set_home_runs_df
+# rebinds it as a whole so readers always see a consistent version.
+_dataset = {
+    'df': None,
+    'by_name': {},
+    'by_alias': {},
+    'validators': {},
+    'version': None
+}
+_refresh_lock = threading.Lock()
+_refresh_requested = threading.Event()
+_refresher = None
+
+
+def normalize_name(name):
+    """
+    Lowercases a player name and strips accents, periods, surrounding
+    punctuation and possessives.
+    """
+    text = unicodedata.normalize('NFKD', str(name))
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    words = [
+        word.replace('.', '').strip(string.punctuation)
+        for word in text.split()
+    ]
+    words = [word[:-2] if word.endswith("'s") else word for word in words]
+    return ' '.join(word for word in words if word)
+
+
+def name_aliases(normalized_name):
+    """
+    Returns the alternate keys a player name can be found under: the name
+    without a Jr./Sr. style suffix and the bare first + last name.
+    """
+    words = normalized_name.split()
+    if len(words) > 2 and words[-1] in NAME_SUFFIXES:
+        words = words[:-1]
+    aliases = [' '.join(words)]
+    if len(words) > 2:
+        aliases.append(f"{words[0]} {words[-1]}")
+    return [alias for alias in aliases if alias != normalized_name]
+
+
+def batter_name(title):
+    """
+    Returns the batter's name from a home run title. Titles lead with the
+    batter ("Aaron Judge homers (1) ..."), so this is the run of leading
+    words that contain a capital letter, up to a stop word like "HR" or the
+    end of a clause ("Giancarlo Stanton, Aaron Judge go back-to-back").
+    """
+    words = []
+    for word in str(title).split()[:6]:
+        if (not any(char.isupper() for char in word)
+                or normalize_name(word) in TITLE_STOP_WORDS):
+            break
+        words.append(word)
+        if word[-1] in ',;:':
+            break
+    return ' '.join(words)
+
+
+def build_player_index(df):
+    """
+    Groups home run rows by batter in one pass over the titles.
+
+    Returns (by_name, by_alias): dicts mapping a normalized name to the row
+    positions of that batter's home runs, in dataset order.
+    """
+    import numpy as np
+
+    names = df['title'].map(batter_name)
+    # Normalize each distinct name once rather than once per row
+    unique_names = names.unique()
+    keys = names.map(
+        dict(zip(unique_names, map(normalize_name, unique_names),
+                 strict=True)))
+    # Positions are kept as int32 arrays, one buffer per batter, rather
+    # than lists of int objects each worker's refcounting would copy
+    by_name = {
+        key: positions.astype('int32')
+        for key, positions in keys.groupby(keys.values).indices.items()
+        if key
+    }
+
+    by_alias = {}
+    for key, positions in by_name.items():
+        for alias in name_aliases(key):
+            by_alias.setdefault(alias, []).append(positions)
+    by_alias = {
+        alias: np.sort(np.concatenate(groups))
+        for alias, groups in by_alias.items()
+    }
+    return by_name, by_alias
+
+
+def schema_dtypes(schema):
+    """
+    Returns the pandas dtypes for a schema: 'string' becomes an Arrow
+    string dtype, or object without pyarrow.
+    """
+    import pandas as pd
+    try:
+        import pyarrow as pa
+        string = pd.ArrowDtype(pa.string())
+    except ImportError:
+        string = object
+    return {
+        column: string if kind == 'string' else kind
+        for column, kind in schema.items()
+    }
+
+
+def apply_schema(df):
+    """
+    Returns the frame with exactly HOME_RUN_COLUMNS, in their schema types.
+    Also used after concatenating, which widens categoricals and strings
+    back to object.
+    """
+    return df[HOME_RUN_COLUMNS].astype(schema_dtypes(HOME_RUN_SCHEMA))
+
+
+def read_home_run_csv(url, source=None):
+    """
+    Reads one home run CSV (from source if given, else from url), keeping
+    only the CSV_SCHEMA columns, and tags its rows with the season it
+    covers, taken from the file name (e.g. 2024-postseason-mlb-homeruns.csv).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(source if source is not None else url,
+                     usecols=lambda column: column in CSV_SCHEMA,
+                     dtype=schema_dtypes(CSV_SCHEMA))
+    for column in CSV_SCHEMA:
+        if column not in df:
+            df[column] = None
+    season_year, is_postseason = _source_season(url)
+    df['title'] = df['title'].fillna('')
+    df['season_year'] = season_year
+    df['is_postseason'] = is_postseason
+    return apply_schema(add_home_run_metadata(df))
+
+
+def _source_season(url):
+    file_name = url.split('/')[-1]
+    return file_name.split('-')[0], 'postseason' in file_name
+
+
+def _source_rows(df, url):
+    """
+    Returns the rows of a loaded dataset that came from the given CSV.
+    """
+    season_year, is_postseason = _source_season(url)
+    return df[(df['season_year'] == season_year)
+              & (df['is_postseason'] == is_postseason)]
+
+
+def fetch_home_run_csv(url, validators=None):
+    """
+    Downloads one home run CSV, conditionally on the ETag / Last-Modified
+    validators from a previous fetch. Returns (df, validators), where df is
+    None if the file hasn't changed.
+    """
+    headers = {}
+    if validators and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    response = http_get(url, headers=headers)
+    if response.status_code == 304:
+        return None, validators
+    response.raise_for_status()
+
+    df = read_home_run_csv(url, io.BytesIO(response.content))
+    return df, {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')
+    }
+
+
+def home_run_id(video_url):
+    """
+    Returns a stable ID for a home run, derived from its video URL. Unlike
+    a player's video index, it doesn't change when the dataset is reloaded.
+    """
+    return hashlib.sha1(str(video_url).encode()).hexdigest()[:16]
+
+
+def add_home_run_metadata(df):
+    """
+    Adds the hr_number and is_inside_park columns, parsed from the titles
+    across the whole frame at once, and the home_run_id column.
+    """
+    import pandas as pd
+
+    # Parsed as Python strings: the patterns use unnamed groups, which
+    # Arrow-backed extract doesn't support
+    titles = df['title'].astype(object).str.lower()
+    hr_number = pd.Series(None, index=df.index, dtype=object)
+    for pattern in HR_NUMBER_PATTERNS:
+        hr_number = hr_number.fillna(titles.str.extract(pattern,
+                                                        expand=False))
+    df['hr_number'] = hr_number.astype(object).where(hr_number.notna(), None)
+    df['is_inside_park'] = titles.str.contains('inside-the-park',
+                                               regex=False)
+    df['home_run_id'] = df['video'].map(home_run_id)
+    return df
+
+
+def load_home_runs_from_csv():
+    """
+    Downloads and concatenates all home run CSVs. Returns the frame and the
+    validators of each CSV, keyed by URL.
+    """
+    import pandas as pd
+
+    frames, validators = [], {}
+    for url in CSV_URLS:
+        df, validators[url] = fetch_home_run_csv(url)
+        frames.append(df)
+    return apply_schema(pd.concat(frames, ignore_index=True)), validators
+
+
+def _snapshot_meta_path():
+    return os.path.splitext(SNAPSHOT_PATH)[0] + '.json'
+
+
+def read_snapshot():
+    """
+    Memory-maps the local snapshot. Returns (df, validators), or None if it
+    is missing or was built from other sources or by an older loader.
+    """
+    try:
+        with open(_snapshot_meta_path()) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('version') != SNAPSHOT_VERSION or meta.get(
+            'sources') != CSV_URLS:
+        logger.warning("Home run snapshot is out of date")
+        return None
+
+    df = map_snapshot(SNAPSHOT_PATH)
+    return None if df is None else (df, meta.get('validators', {}))
+
+
+def map_snapshot(path):
+    """
+    Returns a snapshot file as a frame whose string columns are Arrow arrays
+    over a memory map of the file rather than Python objects on the heap,
+    or None if it can't be read. Numeric columns are small and copied.
+    """
+    try:
+        import pandas as pd
+        import pyarrow as pa
+        from pyarrow import feather
+
+        table = feather.read_table(path, memory_map=True)
+        arrow_strings = {
+            pa.string(): pd.ArrowDtype(pa.string()),
+            pa.large_string(): pd.ArrowDtype(pa.large_string())
+        }
+        return table.to_pandas(types_mapper=arrow_strings.get)
+    except ImportError:
+        logger.warning("pyarrow is not installed, skipping home run snapshot")
+    except Exception as e:
+        logger.error("Error reading home run snapshot: %s", e)
+    return None
+
+
+def write_snapshot(df, validators):
+    """
+    Writes the dataset to the local snapshot along with its version stamp.
+    The files are written under temporary names and then renamed, so a
+    reader never sees a partial snapshot. Returns the memory-mapped frame
+    of what was written, or None if it couldn't be written.
+    """
+    try:
+        from pyarrow import feather
+    except ImportError:
+        logger.warning(
+            "pyarrow is not installed, not writing home run snapshot")
+        return None
+
+    # Named per process, as every gunicorn worker refreshes on its own
+    tmp_suffix = f'.{os.getpid()}.tmp'
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'sources': CSV_URLS,
+        'built_at': time.time(),
+        'rows': len(df),
+        'validators': validators,
+    }
+    try:
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH) or '.', exist_ok=True)
+        # Uncompressed so the file can be memory-mapped on read
+        feather.write_feather(df,
+                              SNAPSHOT_PATH + tmp_suffix,
+                              compression='uncompressed')
+        with open(_snapshot_meta_path() + tmp_suffix, 'w') as f:
+            json.dump(meta, f)
+        # Mapped before the rename, so the frame is this file even if
+        # another worker replaces the snapshot right after
+        mapped = map_snapshot(SNAPSHOT_PATH + tmp_suffix)
+        os.replace(SNAPSHOT_PATH + tmp_suffix, SNAPSHOT_PATH)
+        os.replace(_snapshot_meta_path() + tmp_suffix, _snapshot_meta_path())
+        logger.info("Wrote home run snapshot to %s", SNAPSHOT_PATH)
+        return mapped
+    except Exception as e:
+        logger.error("Error writing home run snapshot: %s", e)
+        return None
+
+
+def set_built_home_runs(df, validators):
+    """
+    Snapshots a dataset built from the CSVs and swaps in its memory-mapped
+    copy, so the parsed frames can be freed. Without a snapshot the built
+    frame itself is used.
+    """
+    mapped = write_snapshot(df, validators)
+    set_home_runs_df(df if mapped is None else mapped, validators)
+
+
+def load_home_runs(refresh=False):
+    """
+    Loads the home run dataset and makes it current, preferring the local
+    snapshot and falling back to the remote CSVs (refreshing the snapshot)
+    when it is missing or out of date. refresh=True always goes to the CSVs.
+    """
+    snapshot = None if refresh else read_snapshot()
+    if snapshot is not None:
+        df, validators = snapshot
+        logger.info("Loaded %s home runs from snapshot", len(df))
+        set_home_runs_df(df, validators)
+        # Have the refresher check the snapshot's validators against the
+        # CSVs as soon as it starts
+        request_refresh()
+    else:
+        df, validators = load_home_runs_from_csv()
+        logger.info("Loaded %s home runs from CSV", len(df))
+        set_built_home_runs(df, validators)
+    return _dataset['df']
+
+
+def memory_report(df):
+    """
+    Returns the bytes used by each column of a frame (and its index), with
+    strings counted in full. Arrow-backed columns are counted even when
+    they are a shared memory map.
+    """
+    usage = df.memory_usage(deep=True)
+    report = {str(column): int(size) for column, size in usage.items()}
+    report['total'] = int(usage.sum())
+    return report
+
+
+def set_home_runs_df(df, validators=None):
+    """
+    Indexes a home run dataset and swaps it in as the current version.
+    """
+    global _dataset
+    validators = validators or {}
+    by_name, by_alias = build_player_index(df)
+    version = hashlib.sha1(
+        json.dumps([SNAPSHOT_VERSION, validators,
+                    len(df)], sort_keys=True).encode()).hexdigest()[:12]
+    _dataset = {
+        'df': df,
+        'by_name': by_name,
+        'by_alias': by_alias,
+        'validators': validators,
+        'version': version
+    }
+    memory = memory_report(df)
+    logger.info("Indexed home runs for %d batters (version %s, %.1f MB)",
+                len(by_name),
+                version,
+                memory['total'] / 1e6,
+                extra={'memory_bytes': memory})
+
+
+def refresh_home_runs():
+    """
+    Re-downloads the CSVs that changed since the current version was built,
+    reusing the rows of the ones that didn't, and swaps in the rebuilt
+    dataset. Returns True if a new version was swapped in.
+    """
+    import pandas as pd
+
+    if not _refresh_lock.acquire(blocking=False):
+        return False  # Another refresh is already running
+
+    try:
+        # Another worker may have refreshed the shared snapshot already;
+        # switch to it rather than keeping a copy of our own
+        snapshot = read_snapshot()
+        adopted = snapshot is not None and snapshot[1] != _dataset[
+            'validators']
+        if adopted:
+            logger.info("Switching to the refreshed home run snapshot")
+            set_home_runs_df(*snapshot)
+
+        dataset = _dataset
+        frames, validators, changed = [], {}, []
+        for url in CSV_URLS:
+            df, validators[url] = fetch_home_run_csv(
+                url, dataset['validators'].get(url))
+            if df is None:
+                df = _source_rows(dataset['df'], url)
+            else:
+                changed.append(url)
+            frames.append(df)
+
+        if not changed:
+            return adopted
+
+        logger.info("Home run CSVs changed: %s", changed)
+        set_built_home_runs(apply_schema(pd.concat(frames, ignore_index=True)),
+                            validators)
+        return True
+    except Exception as e:
+        logger.error("Error refreshing home runs: %s", e)
+        return False
+    finally:
+        _refresh_lock.release()
+
+
+def request_refresh():
+    """
+    Asks the background refresher to check for new data, without waiting
+    for it: now, or once MIN_REFRESH_INTERVAL has passed since the last
+    refresh.
+    """
+    _refresh_requested.set()
+
+
+def _refresh_loop(interval):
+    while True:
+        _refresh_requested.wait(interval)
+        _refresh_requested.clear()
+        refresh_home_runs()
+        # Requests made meanwhile are served by one refresh afterwards
+        time.sleep(MIN_REFRESH_INTERVAL)
+
+
+def start_refresher(interval=REFRESH_INTERVAL):
+    """
+    Starts the background thread that keeps the dataset up to date.
+    """
+    global _refresher
+    if _refresher is None or not _refresher.is_alive():
+        _refresher = threading.Thread(target=_refresh_loop,
+                                      args=(interval, ),
+                                      name='home-run-refresher',
+                                      daemon=True)
+        _refresher.start()
+
+
+def get_home_runs_df():
+    return _dataset['df']
+
+
+def get_dataset_version():
+    return _dataset['version']
+
+
+def get_batter_names():
+    """
+    Returns the name of every batter in the dataset, as written in the
+    titles of their home runs.
+    """
+    dataset = _dataset
+    titles = dataset['df']['title']
+    return [
+        batter_name(titles.iloc[positions[0]])
+        for positions in dataset['by_name'].values()
+    ]
+
+
+@timed('pandas', 'find_home_runs')
+def find_home_runs(player_name):
+    """
+    Looks up a player's home runs in the index, trying the exact name first
+    and then its suffix-less and first/last name aliases.
+    """
+    dataset = _dataset
+    if dataset['df'] is None or not player_name:
+        return []
+
+    key = normalize_name(player_name)
+    positions = dataset['by_name'].get(key)
+    if positions is None:
+        for alias in [key] + name_aliases(key):
+            positions = dataset['by_alias'].get(alias)
+            if positions is None:
+                # "Luis Robert Jr." is indexed as "luis robert" when the
+                # titles leave the suffix out
+                positions = dataset['by_name'].get(alias)
+            if positions is not None:
+                break
+    if positions is None:
+        return []
+
+    # Built column by column: to_dict('records') converts Arrow values one
+    # at a time, which is twice as slow
+    rows = dataset['df'].iloc[positions]
+    columns = []
+    for column in HOME_RUN_COLUMNS:
+        values = rows[column]
+        if column in FLOAT_COLUMNS:
+            values = values.astype('float64').round(FLOAT_DECIMALS)
+        elif HOME_RUN_SCHEMA[column] == 'string':
+            # Arrow strings give pd.NA for missing values, which neither
+            # Firestore nor json can encode
+            values = values.astype(object).where(values.notna(), None)
+        columns.append(values.tolist())
+    return [
+        dict(zip(HOME_RUN_COLUMNS, row, strict=True))
+        for row in zip(*columns, strict=True)
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build the local home run snapshot")
+    parser.add_argument('--refresh',
+                        action='store_true',
+                        help="rebuild from the CSVs even if fresh")
+    args = parser.parse_args()
+
+    from log_utils import configure_logging
+    configure_logging()
+    df = load_home_runs(refresh=args.refresh)
+    for column, size in memory_report(df).items():
+        dtype = df[column].dtype if column in df else ''
+        print(f"{column:<16}{str(dtype):<20}{size / 1e6:>10.2f} MB")
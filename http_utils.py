@@ -0,0 +1,99 @@
+import os
+import types
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics_utils import span, upstream_labels
+from replay_utils import stored_get
+
+STATS_API_URL = "https://statsapi.mlb.com/api/v1"
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+
+# (connect, read) timeouts in seconds for slow endpoints, matched by URL
+# substring; everything else gets DEFAULT_TIMEOUT
+ENDPOINT_TIMEOUTS = [
+    ('/sports/1/players', (3.05, 30)),
+    ('hydrate=stats', (3.05, 20)),
+    ('.csv', (3.05, 60)),
+]
+DEFAULT_TIMEOUT = (3.05, 10)
+
+
+def _build_session():
+    """
+    Creates the shared session: keep-alive connection pools per host and
+    bounded retries with exponential backoff for idempotent requests that
+    fail with a connection error or a 429/5xx.
+    """
+    # Read errors aren't retried: a request that timed out reading would
+    # wait out the read timeout again on every retry, which for a
+    # hydrate=stats call is well past gunicorn's 30s worker timeout
+    retry = Retry(total=3,
+                  read=0,
+                  backoff_factor=0.3,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET', 'HEAD']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=10,
+                          pool_maxsize=POOL_SIZE,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+session = _build_session()
+
+
+def _reset_session():
+    # Pooled connections opened before a fork would be shared with the
+    # parent, so a forked worker starts with a session of its own
+    global session
+    session = _build_session()
+
+
+os.register_at_fork(after_in_child=_reset_session)
+
+
+def timeout_for(url):
+    for fragment, timeout in ENDPOINT_TIMEOUTS:
+        if fragment in url:
+            return timeout
+    return DEFAULT_TIMEOUT
+
+
+def _session_get(url, **kwargs):
+    with span(*upstream_labels(url)):
+        return session.get(url, **kwargs)
+
+
+def http_get(url, **kwargs):
+    """
+    GETs a URL through the shared session, with the endpoint's timeout
+    unless one is given. Responses recorded in the HTTP store (see
+    replay_utils.py) are served from disk instead.
+    """
+    kwargs.setdefault('timeout', timeout_for(url))
+    return stored_get(_session_get, url, **kwargs)
+
+
+def stats_api_get(path, params=None):
+    """
+    GETs a Stats API path (e.g. '/people/660271') and returns the response.
+    """
+    return http_get(f"{STATS_API_URL}{path}", params=params)
+
+
+def get_statsapi():
+    """
+    Imports the statsapi library on first use, as it is slow to import.
+    statsapi calls the module-level requests.get for every request; it is
+    pointed at the shared session so library calls get pooling, timeouts
+    and retries.
+    """
+    import statsapi
+    statsapi.requests = types.SimpleNamespace(get=http_get)
+    return statsapi
@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+
+from metrics_utils import span
+
+logger = logging.getLogger(__name__)
+
+# Players shown per page of the index
+PAGE_SIZE = int(os.environ.get('LEADERBOARD_PAGE_SIZE', 50))
+# Minimum seconds between attempts to restart a listener that stopped
+LISTENER_RETRY_DELAY = 30
+
+_db = None
+_watch = None
+_listener_started_at = 0
+# Players sorted by votes, kept current by the snapshot listener. Rebound
+# as a whole on every snapshot; players is None until the first one lands.
+_leaderboard = {'players': None, 'positions': {}, 'updated_at': 0}
+_listener_lock = threading.Lock()
+
+
+def init_leaderboard(db):
+    """
+    Sets the Firestore client the leaderboard is read from.
+    """
+    global _db
+    _db = db
+
+
+def player_from_doc(doc):
+    player_data = doc.to_dict()
+    if 'id' not in player_data:
+        player_data['id'] = doc.id
+    return player_data
+
+
+def sort_players(players):
+    """
+    Orders players by votes, most first, ties broken by document ID the way
+    Firestore orders them: in the direction of the last order_by, so
+    descending, and cursors from either path page the same way.
+    """
+    return sorted(players,
+                  key=lambda p: (p.get('votes', 0), str(p['id'])),
+                  reverse=True)
+
+
+def _on_snapshot(docs, changes, read_time):
+    global _leaderboard
+    players = sort_players(player_from_doc(doc) for doc in docs)
+    _leaderboard = {
+        'players': players,
+        'positions': {player['id']: i for i, player in enumerate(players)},
+        'updated_at': time.time()
+    }
+
+
+def start_leaderboard_listener():
+    """
+    Materializes favorite_players in memory, sorted by votes, and keeps it
+    current with a Firestore snapshot listener.
+    """
+    global _watch, _listener_started_at
+    with _listener_lock:
+        if _watch is not None:
+            return _watch
+        _listener_started_at = time.monotonic()
+        try:
+            _watch = _db.collection('favorite_players').on_snapshot(
+                _on_snapshot)
+        except Exception as e:
+            logger.error("Error starting leaderboard listener: %s", e)
+        return _watch
+
+
+def _listener_active():
+    # A watch that stopped for good (rather than reconnecting by itself)
+    # no longer gets changes, so its snapshot is stale
+    return _watch is not None and getattr(_watch, 'is_active', True)
+
+
+def _restart_listener():
+    """
+    Replaces a listener that stopped, or never started, at most once every
+    LISTENER_RETRY_DELAY seconds. Pages come from queries until the new
+    listener's first snapshot lands.
+    """
+    global _watch, _leaderboard
+    with _listener_lock:
+        if (_listener_active() or
+                time.monotonic() - _listener_started_at < LISTENER_RETRY_DELAY):
+            return
+        if _watch is not None:
+            logger.warning("Leaderboard listener stopped, restarting it")
+            try:
+                _watch.unsubscribe()
+            except Exception as e:
+                logger.error("Error closing leaderboard listener: %s", e)
+            _watch = None
+        _leaderboard = {'players': None, 'positions': {}, 'updated_at': 0}
+    start_leaderboard_listener()
+
+
+def query_leaderboard(after=None, limit=PAGE_SIZE):
+    """
+    Reads one page of the leaderboard straight from Firestore, ordered by
+    votes and starting after the given player's document.
+    """
+    from firebase_admin import firestore
+
+    query = _db.collection('favorite_players').order_by(
+        'votes', direction=firestore.Query.DESCENDING)
+    if after:
+        cursor = _db.collection('favorite_players').document(after).get()
+        if cursor.exists:
+            query = query.start_after(cursor)
+    with span('firestore', 'favorite_players.query'):
+        docs = list(query.limit(limit + 1).stream())
+    return [player_from_doc(doc) for doc in docs]
+
+
+def get_leaderboard(after=None, limit=PAGE_SIZE):
+    """
+    Returns (players, next_cursor) for the page of players ranked after the
+    player ID in after. Pages come from memory once the listener has its
+    first snapshot, from an ordered, limited query until then. next_cursor
+    is None on the last page. A listener that stopped is restarted, and
+    queried around meanwhile.
+    """
+    if not _listener_active():
+        _restart_listener()
+    leaderboard = _leaderboard
+    if leaderboard['players'] is None or not _listener_active():
+        players = query_leaderboard(after, limit)
+    else:
+        start = 0
+        if after:
+            start = leaderboard['positions'].get(after, -1) + 1
+        players = leaderboard['players'][start:start + limit + 1]
+
+    if len(players) > limit:
+        return players[:limit], players[limit - 1]['id']
+    return players, None
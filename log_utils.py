@@ -0,0 +1,150 @@
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Share of verbose payloads (prompts, raw responses, full records) that are
+# logged at all, even when DEBUG is enabled
+VERBOSE_SAMPLE_RATE = float(os.environ.get('LOG_VERBOSE_SAMPLE_RATE', 0.01))
+# Records queued beyond this are dropped rather than blocking a request
+QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else was passed in extra
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message'}
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, with the fields passed in
+    extra next to the message, as Cloud Logging expects on stdout.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'severity': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({
+            key: value
+            for key, value in vars(record).items()
+            if key not in _RECORD_FIELDS
+        })
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the route and player_id of the current request to every record
+    logged while handling it.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            if request.url_rule is not None:
+                record.route = request.url_rule.rule
+            player_id = (request.view_args or {}).get('player_id')
+            if player_id is not None:
+                record.player_id = player_id
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full instead of
+    waiting for the writer thread.
+    """
+
+    def enqueue(self, record):
+        with contextlib.suppress(queue.Full):
+            self.queue.put_nowait(record)
+
+
+def configure_logging():
+    """
+    Sets up the root logger once per process. Records are filtered by
+    LOG_LEVEL, tagged with request fields and put on a queue; a background
+    listener thread formats them and writes them to stdout.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestContextFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_listener)
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+
+def _stop_listener():
+    _listener.stop()
+
+
+def _restart_listener():
+    # The listener thread doesn't survive a fork; a forked worker gets a
+    # fresh queue and a listener of its own
+    global _listener
+    log_queue = queue.Queue(QUEUE_SIZE)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue,
+                                               *_listener.handlers)
+    _listener.start()
+
+
+def sampled(rate=None):
+    """
+    Returns whether to log a verbose payload, for a random share of calls.
+    """
+    return random.random() < (VERBOSE_SAMPLE_RATE if rate is None else rate)
+
+
+def _start_request_timer():
+    g.log_request_start = time.perf_counter()
+
+
+def _log_request(response):
+    start = g.pop('log_request_start', None)
+    if start is not None:
+        logging.getLogger('request').info(
+            "%s %s %s",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                'status': response.status_code,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 1)
+            })
+    return response
+
+
+def init_request_logging(app):
+    """
+    Logs one structured line per request, with its route, status and
+    latency.
+    """
+    app.before_request(_start_request_timer)
+    app.after_request(_log_request)
@@ -1,55 +1,172 @@
+import hashlib
 import json
+import logging
 import os
-import firebase_admin
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from firebase_admin import credentials, firestore
 from flask import (
     Flask,
+    Response,
+    jsonify,
+    make_response,
     redirect,
     render_template,
     request,
     send_from_directory,
+    stream_with_context,
     url_for,
-    jsonify,
 )
-from fuzzywuzzy import fuzz
-from gemini_utils import analyze_video, init_gemini
-import re
+
+from cache_utils import (
+    NOT_FOUND,
+    cache_counters,
+    cache_get,
+    cache_set,
+    cache_set_missing,
+    flight,
+    init_cache,
+    single_flight,
+)
+from gemini_utils import GEMINI_MODEL_NAME, analyze_video, init_gemini
+from home_run_utils import (
+    get_dataset_version,
+    get_home_runs_df,
+    load_home_runs,
+    request_refresh,
+    start_refresher,
+)
+from http_utils import get_statsapi, http_get
+from leaderboard_utils import (
+    get_leaderboard,
+    init_leaderboard,
+    start_leaderboard_listener,
+)
+from log_utils import configure_logging, init_request_logging, sampled
+from metrics_utils import init_metrics, register_counters, span, traced
+from player_utils import (
+    find_player_team,
+    get_player_directory,
+    search_player_directory,
+)
+from response_utils import (
+    ANALYSIS_CACHE_CONTROL,
+    STATS_CACHE_CONTROL,
+    VIDEO_CACHE_CONTROL,
+    cache_response,
+    compress_response,
+    is_not_modified,
+    make_etag,
+    not_modified,
+)
+from startup_utils import readiness, requires, run_startup
+from stats_utils import content_hash, get_player_stats
+from vote_utils import (
+    init_votes,
+    player_exists,
+    record_vote,
+    start_vote_writer,
+)
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.after_request(compress_response)
+init_metrics(app)
+init_request_logging(app)
+register_counters(cache_counters)
+# Runs independent lookups of a request concurrently
+executor = ThreadPoolExecutor(max_workers=16)
+
+# Set once Firebase is initialized; routes that use it require 'firebase'
+db = None
+
+
+def init_firebase():
+    """
+    Connects to Firestore and starts the threads that depend on it.
+    firebase_admin is imported here, as it is slow to import.
+    """
+    global db
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    firebase_creds = json.loads(os.environ['FIREBASE_CREDENTIALS'])
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate(firebase_creds))
+    client = firestore.client()
+    init_cache(client)
+    init_votes(client)
+    init_leaderboard(client)
+    db = client
+    start_vote_writer()
+    start_leaderboard_listener()
+
+
+def init_home_runs():
+    # Already loaded when gunicorn preloaded the app; see preload
+    if get_home_runs_df() is None:
+        load_home_runs()
+    start_refresher()
+
+
+def preload():
+    """
+    Loads the home run dataset and its indexes in the gunicorn master
+    before it forks, so every worker shares that one read-only copy (see
+    gunicorn.conf.py). A worker whose copy failed to load loads its own.
+    """
+    # Imported, not initialized: the clients must be created after the
+    # fork, but the modules themselves can be shared
+    import firebase_admin.firestore  # noqa: F401
+    import google.generativeai  # noqa: F401
+    get_statsapi()
+
+    try:
+        load_home_runs()
+    except Exception as e:
+        logger.error("Error preloading home runs: %s", e)
+
+
+# The app is served as soon as it is imported; these run in the background
+# and /readyz reports when they are done
+run_startup({
+    'firebase': init_firebase,
+    'home_runs': init_home_runs,
+    'player_directory': get_player_directory,
+})
 
-firebase_creds = json.loads(os.environ['FIREBASE_CREDENTIALS'])
-cred = credentials.Certificate(firebase_creds)
-firebase_admin.initialize_app(cred)
-db = firestore.client()
 
-# Load multiple home run datasets
-csv_urls = [
-    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2016-mlb-homeruns.csv",
-    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2017-mlb-homeruns.csv",
-    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2024-mlb-homeruns.csv",
-    "https://storage.googleapis.com/gcp-mlb-hackathon-2025/datasets/2024-postseason-mlb-homeruns.csv",
-]
+@app.route("/healthz")
+def healthz():
+    return jsonify({'status': 'ok'})
 
-# Concatenate all datasets
-home_runs_df = pd.concat([pd.read_csv(url) for url in csv_urls],
-                         ignore_index=True)
 
-# --- Optimization: Convert 'title' to string type once ---
-home_runs_df["title"] = home_runs_df["title"].astype(str)
-print(f"Loaded {len(home_runs_df)} total home runs")
+@app.route("/readyz")
+def readyz():
+    status = readiness()
+    return jsonify(status), 200 if status['ready'] else 503
 
 
 @app.route("/video/<player_id>")
 @app.route("/video/<player_id>/<int:video_index>")
+@requires('firebase', 'home_runs')
 def video(player_id, video_index=0):
     try:
         if not player_id:
             return render_template('index.html',
                                    error="Invalid player ID"), 404
 
-        player_info = get_player_info(player_id)
+        # The player and team lookups only need the ID from the URL, so
+        # run them concurrently rather than one after another
+        player_info_future = executor.submit(traced(get_player_info),
+                                             player_id)
+        team_future = executor.submit(traced(get_player_team), player_id)
+
+        player_info = player_info_future.result()
         if not player_info or 'people' not in player_info:
             return render_template(
                 'index.html',
@@ -60,16 +177,10 @@ def video(player_id, video_index=0):
         player_id = player['id']
 
         # Get team and position information
-        doc_ref = db.collection('favorite_players').document(str(player_id))
-        player_doc = doc_ref.get()
-        if player_doc.exists:
-            player_data = player_doc.to_dict()
-            player_info['people'][0]['team'] = player_data.get('team', 'N/A')
-        else:
-            player_team, team_id = get_team_from_roster(player_id)
-            player_info['people'][0][
-                'team'] = player_team if player_team != 'N/A' else player_info[
-                    'people'][0].get('currentTeam', {}).get('name', 'N/A')
+        player_team = team_future.result()
+        player_info['people'][0][
+            'team'] = player_team if player_team != 'N/A' else player_info[
+                'people'][0].get('currentTeam', {}).get('name', 'N/A')
         player_info['people'][0]['position'] = player_info['people'][0].get(
             'primaryPosition', {}).get('name', 'N/A')
 
@@ -78,285 +189,112 @@ def video(player_id, video_index=0):
         # First try getting cached home runs
         home_runs = get_all_home_runs(player_name)
 
-        # If we've seen all videos, refresh data from CSVs
-        if video_index >= len(home_runs):
-            # Reload CSV data
-            global home_runs_df
-            home_runs_df = pd.concat([pd.read_csv(url) for url in csv_urls],
-                                     ignore_index=True)
-            home_runs_df["title"] = home_runs_df["title"].astype(str)
-
-            # Try getting home runs again with fresh data
-            home_runs = get_all_home_runs(player_name)
-            video_index = 0  # Reset index for new videos
-
         if not home_runs:
             return "No home run videos found for this player", 404
 
-        # Check video cache first
-        video_cache_ref = db.collection('video_cache').document(
-            f"{player_id}_{video_index}")
-        cache_doc = video_cache_ref.get()
+        # If we've seen all videos, start over and have the background
+        # refresher check the CSVs for new ones
+        if video_index >= len(home_runs):
+            request_refresh()
+            video_index = 0  # Reset index for new videos
 
-        print(f"Checking cache for player {player_id}, video {video_index}")
+        # The page only changes with the dataset and the player's details
+        etag = make_etag(get_dataset_version(), player_info['people'][0],
+                         video_index, home_runs[video_index]['home_run_id'])
+        if is_not_modified(etag):
+            return not_modified(etag, VIDEO_CACHE_CONTROL)
 
-        if cache_doc and cache_doc.exists:
-            print("Loading from cache...")
-            current_homer = cache_doc.to_dict()
+        # Check video cache first. Entries are keyed by the home run itself,
+        # so they survive dataset reloads and are shared between players
+        video_cache_key = home_runs[video_index]['home_run_id']
+        cached_homer = cache_get('video_cache', video_cache_key)
+
+        if cached_homer:
+            current_homer = cached_homer
             # Ensure all required fields are present
             required_fields = [
                 'video', 'title', 'ExitVelocity', 'HitDistance', 'LaunchAngle'
             ]
-            if all(field in current_homer for field in required_fields):
-                print("Successfully loaded from cache")
-            else:
-                print("Cache entry incomplete, falling back to source data")
+            if not all(field in current_homer for field in required_fields):
+                logger.warning("Video cache entry incomplete, falling back "
+                               "to source data")
                 current_homer = home_runs[video_index]
         else:
-            print("Cache miss, loading from source...")
+            # season_year, hr_number and is_inside_park are precomputed
+            # for every row when the dataset is loaded
             current_homer = home_runs[video_index]
 
-            # Extract home run number from title using multiple patterns
-            hr_match = None
-            hr_patterns = [
-                r'homers?\s*\((\d+)\)',
-                r'\((\d+)\)\s*on a',
-                r'home run (?:no\.|number|#)\s*(\d+)',
-                r'(\d+)(?:th|st|nd|rd)\s+home run',
-            ]
-
-            print("\n==== DEBUG: HR NUMBER EXTRACTION ====")
-            print(f"DEBUG: Processing title: '{current_homer['title']}'")
-            print(f"DEBUG: Full homer data: {current_homer}")
-
-            for pattern in hr_patterns:
-                print(f"\nDEBUG: Trying pattern: '{pattern}'")
-                hr_match = re.search(pattern, current_homer['title'].lower())
-                if hr_match:
-                    print(f"DEBUG: MATCH FOUND with pattern '{pattern}'")
-                    print(f"DEBUG: Matched group: '{hr_match.group(1)}'")
-                    break
-                print(f"DEBUG: No match for pattern '{pattern}'")
-
-            hr_number = hr_match.group(1) if hr_match else None
-            print(f"DEBUG: Extracted HR number: {hr_number}")
-            print(f"DEBUG: Raw homer data: {current_homer}")
-
-            # Set the home run number and print for debugging
-            current_homer['hr_number'] = str(hr_number) if hr_number else None
-            print(
-                f"Extracted HR number: {current_homer['hr_number']} from title: {current_homer['title']}"
-            )
-
-            season_year = '2024'  # Default value
-            for url in csv_urls:
-                current_df = pd.read_csv(url)
-                if current_homer['title'] in current_df['title'].values:
-                    season_year = url.split('/')[-1].split('-')[0]
-                    break
-
-            current_homer['season_year'] = season_year
-
             # Update the video cache in database with simplified data structure
             try:
-                print("\n==== DEBUG: CACHE OPERATION ====")
-                hr_number_to_cache = str(hr_number) if hr_number else None
-                print(f"DEBUG: HR number being cached: '{hr_number_to_cache}'")
-
                 cache_data = {
                     'video': current_homer['video'],
                     'title': current_homer['title'],
                     'ExitVelocity': current_homer['ExitVelocity'],
                     'HitDistance': current_homer['HitDistance'],
                     'LaunchAngle': current_homer['LaunchAngle'],
-                    'season_year': season_year,
-                    'hr_number': hr_number_to_cache,
-                    'cached_at': firestore.SERVER_TIMESTAMP
+                    'season_year': current_homer['season_year'],
+                    'hr_number': current_homer['hr_number'],
+                    'is_inside_park': current_homer['is_inside_park']
                 }
-
-                print("DEBUG: Writing cache data:")
-                print(f"DEBUG: {cache_data}")
-                video_cache_ref.set(cache_data)
-                print("\nDEBUG: Cache data being set:")
-                print(
-                    f"DEBUG: HR Number in cache: {cache_data.get('hr_number')}"
-                )
-                print(f"DEBUG: Full cache data: {cache_data}")
-                print("Successfully cached video data")
-            except Exception as e:
-                print(f"Error updating video cache: {e}")
-
-            # Find which CSV file contains this home run and extract season year
-            season_year = '2024'  # Default value
-            current_title = current_homer['title']
-            for url in csv_urls:
-                df = pd.read_csv(url)
-                if current_title in df['title'].values:
-                    season_year = url.split('/')[-1].split('-')[0]
-                    current_homer['season_year'] = season_year
-                    break
-
-            if 'season_year' not in current_homer:
-                current_homer['season_year'] = season_year
-
-            # Use the hr_number that was already extracted and stored
-            current_homer['hr_number'] = str(hr_number) if hr_number else 'N/A'
-
-            # Check for inside-the-park home run
-            current_homer[
-                'is_inside_park'] = 'inside-the-park' in current_homer[
-                    'title'].lower()
-
-            try:
-                from datetime import datetime
-                video_cache_ref.set({
-                    'video':
-                    current_homer['video'],
-                    'title':
-                    current_homer['title'],
-                    'ExitVelocity':
-                    current_homer['ExitVelocity'],
-                    'HitDistance':
-                    current_homer['HitDistance'],
-                    'LaunchAngle':
-                    current_homer['LaunchAngle'],
-                    'season_year':
-                    season_year,
-                    'hr_number':
-                    hr_number,
-                    'cached_at':
-                    firestore.SERVER_TIMESTAMP
-                })
-
-                # Get existing cache and append new video if it doesn't exist
-                existing_cache = video_cache_ref.get()
-                if existing_cache.exists:
-                    existing_data = existing_cache.to_dict()
-                    existing_videos = existing_data.get('videos', [])
-
-                    # Check if video already exists
-                    video_exists = any(
-                        v.get('video_url') == current_homer['video']
-                        for v in existing_videos)
-                    if not video_exists:
-                        existing_videos.append(cache_data['videos'][0])
-                        video_cache_ref.update({'videos': existing_videos})
-                else:
-                    video_cache_ref.set(cache_data)
+                cache_set('video_cache', video_cache_key, cache_data)
             except Exception as e:
-                print(f"Error updating video cache: {e}")
-
-        return render_template('video.html',
-                               player_name=player_name,
-                               player_id=str(player_id),
-                               player=player_info['people'][0],
-                               home_runs=home_runs,
-                               video_index=video_index)
+                logger.error("Error updating video cache: %s", e)
+
+        return cache_response(
+            make_response(
+                render_template('video.html',
+                                player_name=player_name,
+                                player_id=str(player_id),
+                                player=player_info['people'][0],
+                                home_runs=home_runs,
+                                video_index=video_index)), etag,
+            VIDEO_CACHE_CONTROL)
     except Exception as e:
-        print(f"Error in video route: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in video route: %s", e)
         return "Error fetching video", 500
 
 
 @app.route("/stats/<player_id>")
+@requires('firebase')
 def stats(player_id):
     try:
-        print(f"DEBUG: Attempting to lookup player with ID: {player_id}")
         # Get player info using direct API call
         player_info = get_player_info(player_id)
-        print(f"DEBUG: Player lookup result: {player_info}")
         if not player_info or 'people' not in player_info:
-            print(f"DEBUG: No player found for ID: {player_id}")
+            logger.info("No player found for ID %s", player_id)
             return "Player not found", 404
 
         player = player_info['people'][0]
         stats_by_year = {}
 
         try:
-            # Initialize stats structure
-            stats_by_year = {
-                'career': {
-                    'hitting': {},
-                    'pitching': {},
-                    'fielding': {}
-                },
-                'vsplayer': {
-                    'total': {},
-                    'splits': []
-                }
-            }
-
-            # Get career stats and season stats
-            stats_url = f"https://statsapi.mlb.com/api/v1/people/{player['id']}?hydrate=stats(group=[hitting,pitching,fielding],type=[career,yearByYear])"
-            response = requests.get(stats_url)
-            response.raise_for_status()
-            stats_data = response.json()
-
-            if 'people' in stats_data and stats_data['people']:
-                player_stats = stats_data['people'][0].get('stats', [])
-                for stat_group in player_stats:
-                    group = stat_group.get('group', {}).get('displayName',
-                                                            '').lower()
-                    type_name = stat_group.get('type',
-                                               {}).get('displayName', '')
-
-                    if group in ['hitting', 'pitching', 'fielding']:
-                        if type_name == 'career':
-                            stats_by_year['career'][group] = {
-                                'stat':
-                                stat_group.get('splits',
-                                               [{}])[0].get('stat', {}),
-                                'team':
-                                stat_group.get('splits',
-                                               [{}])[0].get('team', {}),
-                                'league':
-                                stat_group.get('splits',
-                                               [{}])[0].get('league', {}),
-                                'position':
-                                stat_group.get('splits',
-                                               [{}])[0].get('position', {})
-                            }
-                        elif type_name == 'yearByYear':
-                            if 'seasons' not in stats_by_year['career'][group]:
-                                stats_by_year['career'][group]['seasons'] = []
-                            stats_by_year['career'][group]['seasons'].extend(
-                                stat_group.get('splits', []))
+            # Served from player_stats; only the current season is
+            # refreshed from the Stats API once it goes stale
+            stats_by_year = get_player_stats(player['id'], player['fullName'])
 
             # Get current team from favorite_players collection
-            doc_ref = db.collection('favorite_players').document(
-                str(player['id']))
-            player_doc = doc_ref.get()
-            if player_doc.exists:
-                player_data = player_doc.to_dict()
-                player['team'] = player_data.get('team')
-                player['position'] = player_data.get('position')
-
-            # Save stats to Firestore
-            try:
-                stats_ref = db.collection('player_stats').document(
-                    str(player['id']))
-                stats_data = {
-                    'player_id': str(player['id']),
-                    'name': player['fullName'],
-                    'stats': stats_by_year,
-                    'last_updated': firestore.SERVER_TIMESTAMP
-                }
-                stats_ref.set(stats_data)
-                print(f"Successfully cached stats for {player['fullName']}")
-            except Exception as e:
-                print(f"Error caching stats: {e}")
-
-            return render_template('stats.html',
-                                   player=player,
-                                   stats_by_year=stats_by_year)
+            favorite = get_favorite_team(player['id'])
+            if favorite:
+                player['team'] = favorite.get('team')
+                player['position'] = favorite.get('position')
+
+            # Repeat views of unchanged stats are answered with a 304
+            etag = make_etag(player, content_hash(stats_by_year))
+            if is_not_modified(etag):
+                return not_modified(etag, STATS_CACHE_CONTROL)
+            return cache_response(
+                make_response(
+                    render_template('stats.html',
+                                    player=player,
+                                    stats_by_year=stats_by_year)), etag,
+                STATS_CACHE_CONTROL)
         except Exception as e:
-            print(f"Error fetching stats: {e}")
+            logger.error("Error fetching stats: %s", e)
             return render_template('stats.html',
                                    player=player,
                                    stats_by_year={})
     except Exception as e:
-        print(f"Error fetching stats: {e}")
+        logger.error("Error fetching stats: %s", e)
         return "Error fetching player stats", 500
 
 
@@ -365,101 +303,99 @@ def get_player_info(player_id, season=None):
     """
     Fetches information about an MLB player using MLB-StatsAPI with caching.
     """
-    import statsapi
+    statsapi = get_statsapi()
 
     if not player_id or str(player_id) == "1":  # Skip invalid IDs
         return None
 
     try:
         # Check cache first
-        player_cache_ref = db.collection('player_cache').document(
-            str(player_id))
-        cache_doc = player_cache_ref.get()
-
-        if cache_doc.exists:
-            cached_data = cache_doc.to_dict()
-            # Return cached data if it exists and is not too old (24 hours)
-            cached_at = cached_data.get('cached_at')
-            if cached_at:
-                from datetime import datetime
-                import pytz
-
-                utc = pytz.UTC
-                now = datetime.now(utc)
-                cached_time = cached_at.todate() if hasattr(
-                    cached_at, 'todate') else cached_at
-                if not cached_time.tzinfo:
-                    cached_time = utc.localize(cached_time)
-
-                time_diff = (now - cached_time).total_seconds()
-                if time_diff < 86400:
-                    print(f"Loading player info from cache for ID {player_id}")
-                    return cached_data.get('player_info')
+        cached_data = cache_get('player_cache', player_id)
+        if cached_data is NOT_FOUND:
+            logger.debug("Player ID %s is cached as not found", player_id)
+            return None
+        if cached_data:
+            logger.debug("Loading player info from cache for ID %s", player_id)
+            return cached_data.get('player_info')
 
         # If not in cache or expired, fetch from API
-        player_info = statsapi.get('person', {'personId': player_id})
+        try:
+            player_info = statsapi.get('person', {'personId': player_id})
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            player_info = {}
+        if not player_info.get('people'):
+            cache_set_missing('player_cache', player_id)
+            return None
         if season:
             player_info['people'][0]['stats'] = statsapi.player_stat_data(
                 player_id, season)
 
         # Cache the result
-        player_cache_ref.set({
-            'player_info': player_info,
-            'cached_at': firestore.SERVER_TIMESTAMP
-        })
+        cache_set('player_cache', player_id, {'player_info': player_info})
 
-        print(f"Player info received and cached for ID {player_id}")
+        logger.debug("Player info received and cached for ID %s", player_id)
         return player_info
     except Exception as e:
-        print(f"Error fetching player information: {e}")
+        logger.error("Error fetching player information: %s", e)
         return None
 
 
 def search_players(player_name):
     """
-    Searches for MLB players by name using the Stats API and fuzzy matching.
-    Handles name suffixes like Jr.
+    Searches for MLB players by name using the cached Stats API player
+    directory and fuzzy matching. Handles name suffixes like Jr.
     """
     try:
-        url = "https://statsapi.mlb.com/api/v1/sports/1/players"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        # Clean up input name
-        clean_name = player_name.lower().replace('.', '').strip()
-
-        # Create list of names with and without suffixes for matching
-        player_matches = []
-        for person in data['people']:
-            full_name = person['fullName'].lower().replace('.', '')
-            name_parts = full_name.split()
-
-            # Try matching with and without suffix
-            base_name = ' '.join(
-                name_parts[:-1]) if len(name_parts) > 2 and name_parts[-1] in [
-                    'jr', 'sr', 'ii', 'iii'
-                ] else full_name
-
-            score1 = fuzz.ratio(clean_name, full_name)
-            score2 = fuzz.ratio(clean_name, base_name)
-            max_score = max(score1, score2)
-
-            if max_score > 70:
-                player_matches.append((person, max_score))
-
-        if player_matches:
-            # Return the highest scoring match
-            best_match = max(player_matches, key=lambda x: x[1])[0]
+        best_match = search_player_directory(player_name)
+        if best_match:
             return {'people': [best_match]}
 
-        else:
-            print(f"No close match found for {player_name}")
-            return None
+        logger.info("No close match found for %s", player_name)
+        return None
 
     except requests.exceptions.RequestException as e:
-        print(f"Error searching for players: {e}")
+        logger.error("Error searching for players: %s", e)
+        return None
+
+
+def get_favorite_team(player_id):
+    """
+    Returns the team and position saved with a player's favorite_players
+    entry, or None if they aren't a favorite, with caching.
+    """
+    cached_data = cache_get('favorite_team', player_id)
+    if cached_data is NOT_FOUND:
         return None
+    if cached_data:
+        return cached_data
+
+    with span('firestore', 'favorite_players.get'):
+        player_doc = db.collection('favorite_players').document(
+            str(player_id)).get()
+    if not player_doc.exists:
+        cache_set_missing('favorite_team', player_id)
+        return None
+    player_data = player_doc.to_dict()
+    favorite = {
+        'team': player_data.get('team', 'N/A'),
+        'position': player_data.get('position')
+    }
+    cache_set('favorite_team', player_id, favorite)
+    return favorite
+
+
+def get_player_team(player_id):
+    """
+    Returns a player's team name, preferring the one saved with their
+    favorite_players entry over a roster lookup.
+    """
+    favorite = get_favorite_team(player_id)
+    if favorite:
+        return favorite['team']
+    player_team, team_id = get_team_from_roster(player_id)
+    return player_team
 
 
 def get_team_from_roster(player_id, season=2025):
@@ -468,71 +404,44 @@ def get_team_from_roster(player_id, season=2025):
     """
     try:
         # Check cache first
-        roster_cache_ref = db.collection('roster_cache').document(
-            f"{player_id}_{season}")
-        cache_doc = roster_cache_ref.get()
-
-        if cache_doc.exists:
-            cached_data = cache_doc.to_dict()
-            # Return cached data if it exists and is not too old (12 hours)
-            if cached_data.get('cached_at') and (
-                    firestore.SERVER_TIMESTAMP -
-                    cached_data.get('cached_at')).total_seconds() < 43200:
-                print(f"Loading roster info from cache for player {player_id}")
-                return cached_data.get('team_name'), cached_data.get('team_id')
-
-        # Expanded list of MLB team IDs
-        team_ids = list(range(108, 122)) + list(range(
-            133, 148))  # Include more team IDs
-
-        # First try getting team directly from player endpoint
-        player_url = f'https://statsapi.mlb.com/api/v1/people/{player_id}?season={season}'
-        player_response = requests.get(player_url)
+        roster_cache_key = f"{player_id}_{season}"
+        cached_data = cache_get('roster_cache', roster_cache_key)
+        if cached_data:
+            logger.debug("Loading roster info from cache for player %s",
+                         player_id)
+            return cached_data.get('team_name'), cached_data.get('team_id')
+
+        # First try getting team directly from player endpoint, then look
+        # the player up in the league-wide roster index
+        team = None
+        player_url = (f'https://statsapi.mlb.com/api/v1/people/{player_id}'
+                      f'?season={season}')
+        player_response = http_get(player_url)
         if player_response.status_code == 200:
             player_data = player_response.json()
             if 'people' in player_data and player_data['people']:
                 current_team = player_data['people'][0].get('currentTeam', {})
                 if current_team:
-                    return current_team.get('name'), current_team.get('id')
+                    team = current_team.get('id'), current_team.get('name')
+        if not team:
+            team = find_player_team(player_id, season)
+        if not team:
+            return "N/A", None
 
-        # If that fails, check each team's roster
-        for team_id in team_ids:
-            try:
-                roster_url = f'https://statsapi.mlb.com/api/v1/teams/{team_id}/roster?season={season}'
-                response = requests.get(roster_url)
-                if response.status_code == 200:
-                    roster_data = response.json()
-                    if 'roster' in roster_data:
-                        for player in roster_data['roster']:
-                            if str(player.get('person',
-                                              {}).get('id')) == str(player_id):
-                                team_response = requests.get(
-                                    f'https://statsapi.mlb.com/api/v1/teams/{team_id}'
-                                )
-                                if team_response.status_code == 200:
-                                    team_data = team_response.json()
-                                    team_name = team_data['teams'][0]['name']
-                                    # Cache the result
-                                    roster_cache_ref.set({
-                                        'team_name':
-                                        team_name,
-                                        'team_id':
-                                        team_id,
-                                        'cached_at':
-                                        firestore.SERVER_TIMESTAMP
-                                    })
-                                    return team_name, team_id
-            except Exception as e:
-                print(f"Error checking team {team_id}: {e}")
-                continue
-
-        return "N/A", None
+        team_id, team_name = team
+        # Cache the result
+        cache_set('roster_cache', roster_cache_key, {
+            'team_name': team_name,
+            'team_id': team_id
+        })
+        return team_name, team_id
     except Exception as e:
-        print(f"Error fetching team from roster: {e}")
+        logger.error("Error fetching team from roster: %s", e)
         return "N/A", None
 
 
 @app.route("/", methods=["GET", "POST"])
+@requires('firebase')
 def index():
     if request.method == "POST":
         player_name = request.form.get("player_name")
@@ -553,52 +462,40 @@ def index():
                     'team': player_team,
                     'position': player['primaryPosition']['name'],
                     'primaryNumber': player.get('primaryNumber', 'N/A'),
-                    'votes': 0
+                    'votes': 0,
+                    'votes_base': 0
+                })
+                # Replaces a cached "not a favorite" answer
+                cache_set('favorite_team', player_id, {
+                    'team': player_team,
+                    'position': player['primaryPosition']['name']
                 })
 
         return redirect(url_for('index'))
 
-    favorite_players_ref = db.collection('favorite_players').stream()
-    favorite_players = []
-    for doc in favorite_players_ref:
-        player_data = doc.to_dict()
-        if 'id' not in player_data:
-            player_data['id'] = doc.id
-        favorite_players.append(player_data)
-
-    # Sort players by votes in descending order
-    favorite_players.sort(key=lambda x: x.get('votes', 0), reverse=True)
-
-    print("Loaded players:",
-          [f"{p['name']} (ID: {p['id']})" for p in favorite_players])
+    # Served from the in-memory leaderboard, a page at a time
+    favorite_players, next_cursor = get_leaderboard(request.args.get('after'))
 
-    return render_template("index.html", favorite_players=favorite_players)
+    return render_template("index.html",
+                           favorite_players=favorite_players,
+                           next_cursor=next_cursor)
 
 
 @app.route("/vote/<player_id>")
+@requires('firebase')
 def vote(player_id):
     try:
-        print(f"Received vote request for player ID: {player_id}")
         player_id = str(player_id).strip()
-        print(f"Looking up document with ID: {player_id}")
-
-        doc_ref = db.collection('favorite_players').document(player_id)
-        player_doc = doc_ref.get()
-        print(f"Document exists: {player_doc.exists}")
-
-        if player_doc.exists:
-            current_votes = player_doc.to_dict().get('votes', 0)
-            try:
-                doc_ref.update({'votes': current_votes + 1})
-                print("Votes updated successfully")
-            except Exception as e:
-                print(f"Error updating votes: {e}")
-            return redirect(url_for('index'))
-        else:
+        if not player_exists(player_id):
             return "Player not found", 404
 
+        # Counted with an atomic shard increment; the votes field shown on
+        # the leaderboard catches up when the vote writer rolls shards up
+        record_vote(player_id)
+        return redirect(url_for('index'))
+
     except Exception as e:
-        print(f"Error updating votes: {e}")
+        logger.error("Error updating votes: %s", e)
         return "Error updating votes", 500
 
 
@@ -612,95 +509,17 @@ def get_player_id(player_name):
             return player_info['people'][0]['id']
         return None
     except Exception as e:
-        print(f"Error getting player ID: {e}")
+        logger.error("Error getting player ID: %s", e)
         return None
 
 
-def analyze_video(player_name, homer_data):
-    try:
-        model = init_gemini()
-        video_url = homer_data.get('video', '')
-        game_id = video_url.split('/')[-1].split('-')[0] if video_url else ''
-
-        # Initialize default values
-        home_team = 'Home Team'
-        away_team = 'Away Team'
-        home_score = 'N/A'
-        away_score = 'N/A'
-        inning = 'N/A'
-        inning_state = ''
-        inning_half = 'N/A'
-        outs = 'N/A'
-        count = 'N/A'
-        base_situation = 'unknown'
-
-        # Get detailed game data from MLB Stats API
-        game_data = {}
-        try:
-            # Get complete game data from boxscore endpoint
-            boxscore_url = f"https://statsapi.mlb.com/api/v1/game/{game_id}/boxscore"
-            boxscore_response = requests.get(boxscore_url)
-            teams_data = boxscore_response.json(
-            ) if boxscore_response.status_code == 200 else {}
-
-            home_team_data = teams_data.get('teams', {}).get('home', {})
-            away_team_data = teams_data.get('teams', {}).get('away', {})
-
-            # Get team names and scores
-            home_team = home_team_data.get('team', {}).get('name', 'Home Team')
-            away_team = away_team_data.get('team', {}).get('name', 'Away Team')
-            home_score = home_team_data.get('teamStats',
-                                            {}).get('batting',
-                                                    {}).get('runs', 'N/A')
-            away_score = away_team_data.get('teamStats',
-                                            {}).get('batting',
-                                                    {}).get('runs', 'N/A')
-
-            # Get detailed game state from linescore endpoint
-            linescore_url = f"https://statsapi.mlb.com/api/v1/game/{game_id}/linescore"
-            linescore_response = requests.get(linescore_url)
-            if linescore_response.status_code == 200:
-                game_data = linescore_response.json()
-
-                # Get inning details
-                inning = game_data.get('currentInning', 'N/A')
-                inning_state = game_data.get('inningState', '').lower()
-                inning_half = 'top' if inning_state == 'top' else 'bottom'
-                outs = game_data.get('outs', 'N/A')
-
-                # Get baserunner situation
-                offense = game_data.get('offense', {})
-                bases = []
-                if offense.get('first'): bases.append('first')
-                if offense.get('second'): bases.append('second')
-                if offense.get('third'): bases.append('third')
-                base_situation = ', '.join(bases) if bases else 'bases empty'
-
-                # Get count if available
-                balls = game_data.get('balls', 'N/A')
-                strikes = game_data.get('strikes', 'N/A')
-                count = f"{balls}-{strikes}" if balls != 'N/A' and strikes != 'N/A' else 'N/A'
-
-            # Get baserunner situation
-            bases_occupied = []
-            if game_data.get('offense', {}).get('first'):
-                bases_occupied.append('first')
-            if game_data.get('offense', {}).get('second'):
-                bases_occupied.append('second')
-            if game_data.get('offense', {}).get('third'):
-                bases_occupied.append('third')
-
-            base_situation = ', '.join(
-                bases_occupied) if bases_occupied else 'bases empty'
+# Bump when build_analysis_prompt changes, so cached analyses made with the
+# old prompt are regenerated
+ANALYSIS_PROMPT_VERSION = 1
 
-        except Exception as e:
-            print(f"Error fetching game data: {e}")
-            inning = home_score = away_score = outs = 'N/A'
-            home_team = away_team = 'Unknown Team'
-            base_situation = 'unknown'
-            inning_state = ''
 
-        prompt = f"""
+def build_analysis_prompt(player_name, homer_data):
+    return f"""
         You are an expert baseball analysis, analyzing this home run.
 
         Home Run Details:
@@ -712,25 +531,35 @@ def analyze_video(player_name, homer_data):
 
         Please analyze:
         The technical aspects of the home run (exit velocity, launch angle, distance)
-        How these metrics compare to MLB averages (typical HR: 95-105 mph exit velo, 25-35° launch angle)
+        How these metrics compare to MLB averages (typical HR: 95-105 mph \
+exit velo, 25-35° launch angle)
 
         """
 
-        response = model.generate_content(prompt)
-        analysis_text = response.text
 
-        # Extract metrics from the analysis
-        metrics = {
-            'exit_velocity': float(homer_data.get('ExitVelocity', 0)),
-            'estimated_distance': float(homer_data.get('HitDistance', 0)),
-            'launch_angle': float(homer_data.get('LaunchAngle', 0))
-        }
+def analysis_metrics(homer_data):
+    # Extract metrics from the analysis
+    return {
+        'exit_velocity': float(homer_data.get('ExitVelocity', 0)),
+        'estimated_distance': float(homer_data.get('HitDistance', 0)),
+        'launch_angle': float(homer_data.get('LaunchAngle', 0))
+    }
+
 
-        return {'text': analysis_text, 'metrics': metrics}
+def analyze_video(player_name, homer_data):
+    try:
+        model = init_gemini()
+        prompt = build_analysis_prompt(player_name, homer_data)
+        with span('gemini', 'generate'):
+            response = model.generate_content(prompt)
+        analysis_text = response.text
+
+        return {'text': analysis_text, 'metrics': analysis_metrics(homer_data)}
     except Exception as e:
-        print(f"Error in analyze_video: {e}")
+        logger.error("Error in analyze_video: %s", e)
         return {
             'text': "Error analyzing video",
+            'error': True,
             'metrics': {
                 'exit_velocity': 0,
                 'estimated_distance': 0,
@@ -744,89 +573,278 @@ def serve_css():
     return send_from_directory(app.static_folder, 'styles.css')
 
 
+def generate_analysis(player_id, player_name, video_index, current_homer):
+    """
+    Returns the analysis of a home run from analysis_cache, generating it
+    with Gemini and caching it on a miss. Failed generations are returned
+    but not cached, so they are retried on the next request.
+    """
+    # Check cache first
+    analysis_cache_key = get_analysis_cache_key(current_homer)
+    cached_analysis = cache_get('analysis_cache', analysis_cache_key)
+    if cached_analysis:
+        return cached_analysis
+
+    # Concurrent requests for the same analysis share one Gemini call
+    return single_flight(('analysis_cache', analysis_cache_key),
+                         _generate_and_cache_analysis, analysis_cache_key,
+                         player_id, player_name, video_index, current_homer)
+
+
+def _generate_and_cache_analysis(analysis_cache_key, player_id, player_name,
+                                 video_index, current_homer):
+    # A leader that finished between our cache read and claiming the
+    # flight has already cached it
+    cached_analysis = cache_get('analysis_cache', analysis_cache_key)
+    if cached_analysis:
+        return cached_analysis
+
+    # Generate new analysis
+    logger.info("Generating analysis for %s #%s", player_name, video_index)
+    if logger.isEnabledFor(logging.DEBUG) and sampled():
+        logger.debug("Analysis request", extra={'homer': current_homer})
+
+    analysis_result = analyze_video(player_name, current_homer)
+    if logger.isEnabledFor(logging.DEBUG) and sampled():
+        logger.debug("Analysis result", extra={'result': analysis_result})
+
+    if analysis_result and 'text' in analysis_result and not analysis_result.get(
+            'error'):
+        cache_analysis(analysis_cache_key, player_id, video_index,
+                       analysis_result, current_homer)
+    return analysis_result
+
+
+def get_analysis_cache_key(homer_data):
+    """
+    Returns the analysis_cache key of a home run: a hash of its ID with the
+    prompt version and model, so cached analyses are shared by every path
+    to the same home run and regenerated when the prompt or model changes.
+    """
+    identity = (f"{homer_data['home_run_id']}:{ANALYSIS_PROMPT_VERSION}:"
+                f"{GEMINI_MODEL_NAME}")
+    return hashlib.sha1(identity.encode()).hexdigest()[:24]
+
+
+def cache_analysis(analysis_cache_key, player_id, video_index,
+                   analysis_result, homer_data):
+    cache_set('analysis_cache', analysis_cache_key, {
+        'text': analysis_result['text'],
+        'metrics': analysis_result['metrics'],
+        'player_id': str(player_id),
+        'video_index': video_index,
+        'home_run_id': homer_data['home_run_id'],
+        'video': homer_data['video']
+    })
+
+
+def format_analysis_lines(lines):
+    """
+    Renders lines of analysis text as HTML, with "Label: text" lines shown
+    as labelled points.
+    """
+    html = ''
+    for line in lines:
+        line = line.strip().replace('*', '')  # Remove asterisks
+        if not line:
+            continue
+        if ':' in line:
+            label, content = line.split(':', 1)
+            html += (f'<div class="analysis-point"><strong>{label.strip()}:'
+                     f'</strong>{content.strip()}</div>')
+        else:
+            html += f'<div class="analysis-text">{line}</div>'
+    return html
+
+
+def format_analysis_html(text):
+    return ('<div class="analysis-section">' +
+            format_analysis_lines(text.split('\n')) + '</div>')
+
+
+def find_home_run(player_id, video_index):
+    """
+    Returns (player_name, home run) for a player's video index, or
+    (None, None) if the player or video doesn't exist.
+    """
+    player_info = get_player_info(player_id)
+    if not player_info or 'people' not in player_info:
+        return None, None
+
+    player_name = player_info['people'][0]['fullName']
+    from gemini_utils import get_all_home_runs
+    home_runs = get_all_home_runs(player_name)
+    if not home_runs or video_index >= len(home_runs):
+        return player_name, None
+    return player_name, home_runs[video_index]
+
+
 @app.route("/api/analysis/<player_id>/<int:video_index>")
+@requires('firebase', 'home_runs')
 def get_analysis(player_id, video_index):
     try:
-        player_info = get_player_info(player_id)
-        if not player_info or 'people' not in player_info:
+        player_name, current_homer = find_home_run(player_id, video_index)
+        if not player_name:
             return jsonify({'error': 'Player not found'}), 404
+        if current_homer is None:
+            return jsonify({'error': 'Video not found'}), 404
 
-        player = player_info['people'][0]
-        player_name = player['fullName']
-
-        from gemini_utils import get_all_home_runs
-        home_runs = get_all_home_runs(player_name)
+        if not current_homer or not isinstance(current_homer, dict):
+            logger.error("Invalid homer data structure")
+            return jsonify({'error': 'Invalid video data'}), 500
 
-        if not home_runs or video_index >= len(home_runs):
-            return jsonify({'error': 'Video not found'}), 404
+        # Analyses are cached per home run, prompt and model, so the cache
+        # key identifies the response body
+        etag = make_etag(get_analysis_cache_key(current_homer))
+        if is_not_modified(etag):
+            return not_modified(etag, ANALYSIS_CACHE_CONTROL)
 
-        current_homer = home_runs[video_index]
+        analysis_result = generate_analysis(player_id, player_name,
+                                            video_index, current_homer)
 
-        # Check cache first
-        cache_ref = db.collection('analysis_cache').document(
-            f"{player_id}_{video_index}")
-        cache_doc = cache_ref.get()
+        if not analysis_result:
+            logger.error("Analysis returned None")
+            return jsonify({'html': '<p>Unable to analyze video at this time</p>'}), 200
 
-        if cache_doc.exists:
-            analysis_result = cache_doc.to_dict()
-            print("Loading analysis from cache")
-        else:
-            # Generate new analysis
-            print("\n=== Analysis Request Debug ===")
-            print(f"Player Name: {player_name}")
-            print(f"Video Index: {video_index}")
-            print(f"Homer Data: {current_homer}")
-
-            if not current_homer or not isinstance(current_homer, dict):
-                print("Error: Invalid homer data structure")
-                return jsonify({'error': 'Invalid video data'}), 500
-
-            analysis_result = analyze_video(player_name, current_homer)
-            print(f"\nAnalysis Result: {analysis_result}")
-
-            if not analysis_result:
-                print("Error: Analysis returned None")
-                return jsonify({'html': '<p>Unable to analyze video at this time</p>'}), 200
-
-            if 'text' not in analysis_result:
-                print(f"Error: Missing text in analysis result: {analysis_result}")
-                return jsonify({'html': '<p>Analysis generated invalid results</p>'}), 200
-            # Cache the result
-            try:
-                cache_ref.set({
-                    'text': analysis_result['text'],
-                    'metrics': analysis_result['metrics'],
-                    'player_id': player_id,
-                    'video_index': video_index,
-                    'cached_at': firestore.SERVER_TIMESTAMP
-                })
-                print("Cached new analysis")
-            except Exception as e:
-                print(f"Error caching analysis: {e}")
-                pass
+        if 'text' not in analysis_result:
+            logger.error("Missing text in analysis result")
+            return jsonify({'html': '<p>Analysis generated invalid results</p>'}), 200
 
         # Generate HTML for the analysis
-        lines = [
-            line.strip() for line in analysis_result['text'].split('\n')
-            if line.strip()
-        ]
-        html = '<div class="analysis-section">'
-
-        for line in lines:
-            line = line.replace('*', '').replace('**', '')  # Remove asterisks
-            if ':' in line:
-                label, content = line.split(':', 1)
-                html += f'<div class="analysis-point"><strong>{label.strip()}:</strong>{content.strip()}</div>'
-            else:
-                html += f'<div class="analysis-text">{line}</div>'
-
-        html += '</div>'
-
-        return jsonify({'html': html})
+        html = format_analysis_html(analysis_result['text'])
+
+        response = jsonify({'html': html})
+        if analysis_result.get('error'):
+            return response
+        return cache_response(response, etag, ANALYSIS_CACHE_CONTROL)
     except Exception as e:
-        print(f"Error generating analysis: {e}")
+        logger.error("Error generating analysis: %s", e)
         return jsonify({'error': 'Error generating analysis'}), 500
 
 
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+@app.route("/api/analysis/<player_id>/<int:video_index>/stream")
+@requires('firebase', 'home_runs')
+def stream_analysis(player_id, video_index):
+    """
+    Server-Sent Events version of get_analysis: sends the analysis as HTML
+    chunks while Gemini generates it, then a "done" event. The completed
+    text is cached like a regular analysis.
+    """
+    try:
+        player_name, current_homer = find_home_run(player_id, video_index)
+        if not player_name:
+            return jsonify({'error': 'Player not found'}), 404
+        if not current_homer:
+            return jsonify({'error': 'Video not found'}), 404
+    except Exception as e:
+        logger.error("Error generating analysis: %s", e)
+        return jsonify({'error': 'Error generating analysis'}), 500
+
+    analysis_cache_key = get_analysis_cache_key(current_homer)
+
+    def finished(analysis):
+        # A finished analysis goes out as one chunk
+        if not analysis or analysis.get('error') or 'text' not in analysis:
+            yield sse_event(
+                {'html': '<p>Unable to analyze video at this time</p>'},
+                event='error')
+            return
+        yield sse_event(
+            {'html': format_analysis_lines(analysis['text'].split('\n'))})
+        yield sse_event({}, event='done')
+
+    def generate():
+        cached_analysis = cache_get('analysis_cache', analysis_cache_key)
+        if cached_analysis:
+            yield from finished(cached_analysis)
+            return
+
+        # Shares the in-flight entry of generate_analysis: viewers arriving
+        # while the analysis is being generated, by this route or the JSON
+        # one, wait for it and get the finished text
+        with flight(('analysis_cache', analysis_cache_key)) as (future,
+                                                                leader):
+            if not leader:
+                try:
+                    analysis = future.result()
+                except Exception as e:
+                    logger.error("Error waiting for analysis: %s", e)
+                    analysis = None
+                yield from finished(analysis)
+                return
+
+            # The previous leader may have cached it since the read above
+            cached_analysis = cache_get('analysis_cache', analysis_cache_key)
+            if cached_analysis:
+                future.set_result(cached_analysis)
+                yield from finished(cached_analysis)
+                return
+
+            try:
+                model = init_gemini()
+                if not model:
+                    raise RuntimeError("Could not initialize Gemini model")
+                with span('gemini', 'generate_stream'):
+                    response = model.generate_content(
+                        build_analysis_prompt(player_name, current_homer),
+                        stream=True)
+
+                    # Only complete lines are formatted, so a "Label: text"
+                    # line split across chunks is still rendered as one point
+                    text, pending = '', ''
+                    connected = True
+                    for chunk in response:
+                        text += chunk.text
+                        if not connected:
+                            continue
+                        pending += chunk.text
+                        *lines, pending = pending.split('\n')
+                        html = format_analysis_lines(lines)
+                        if html:
+                            try:
+                                yield sse_event({'html': html})
+                            except GeneratorExit:
+                                # The viewer left; the analysis is still
+                                # finished and cached for the waiters and
+                                # the next view instead of being dropped
+                                connected = False
+
+                analysis_result = {
+                    'text': text,
+                    'metrics': analysis_metrics(current_homer)
+                }
+                cache_analysis(analysis_cache_key, player_id, video_index,
+                               analysis_result, current_homer)
+                future.set_result(analysis_result)
+                if not connected:
+                    return
+                html = format_analysis_lines([pending])
+                if html:
+                    yield sse_event({'html': html})
+                yield sse_event({}, event='done')
+            except Exception as e:
+                logger.error("Error streaming analysis: %s", e)
+                future.set_result({
+                    'text': "Error analyzing video",
+                    'error': True,
+                    'metrics': analysis_metrics(current_homer)
+                })
+                yield sse_event(
+                    {'html': '<p>Unable to analyze video at this time</p>'},
+                    event='error')
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,370 @@
+import atexit
+import functools
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from flask import (
+    Response,
+    before_render_template,
+    g,
+    request,
+    template_rendered,
+)
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+HISTOGRAM_HELP = {
+    'http_request_duration_seconds': 'Time spent serving requests, by route',
+    'dependency_duration_seconds':
+    'Time spent in calls to dependencies, by dependency and operation',
+}
+# Hosts of upstream services, as their dependency label
+UPSTREAM_HOSTS = {
+    'statsapi.mlb.com': 'stats_api',
+    'storage.googleapis.com': 'gcs',
+}
+
+# Set by gunicorn.conf.py when serving with several worker processes: each
+# one writes its metrics to a file here every METRICS_FLUSH_INTERVAL seconds
+# and /metrics, whichever worker answers it, adds up all of them. Files of
+# workers that exited are kept so the totals never go backwards.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# (metric, sorted label items) -> [bucket counts..., sum, count]
+_histograms = {}
+_histograms_lock = threading.Lock()
+# Seconds per dependency spent by the current request, for its
+# Server-Timing header. A ContextVar rather than g so traced executor tasks
+# can add to it from other threads.
+_request_spans = ContextVar('request_spans', default=None)
+_spans_lock = threading.Lock()
+# Callables returning {(metric, labels): value} for counters kept elsewhere
+_counter_sources = []
+_writer = None
+
+
+def observe(metric, seconds, **labels):
+    """
+    Records one observation in a latency histogram.
+    """
+    key = (metric, tuple(sorted(labels.items())))
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+                break
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+@contextmanager
+def span(dependency, operation):
+    """
+    Times a block as a call to a dependency (firestore, stats_api, gemini,
+    pandas, template...). Inside a request the span is also added to the
+    response's Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('dependency_duration_seconds',
+                elapsed,
+                dependency=dependency,
+                operation=operation)
+        _add_span(dependency, elapsed)
+
+
+def _add_span(dependency, elapsed):
+    spans = _request_spans.get()
+    if spans is not None:
+        with _spans_lock:
+            spans[dependency] += elapsed
+
+
+def traced(fn):
+    """
+    Wraps fn to add its spans to the calling request's Server-Timing, for
+    work handed to an executor thread.
+    """
+    spans = _request_spans.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _request_spans.set(spans)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _request_spans.reset(token)
+
+    return wrapper
+
+
+def timed(dependency, operation):
+    """
+    Decorator version of span.
+    """
+
+    def decorator(fn):
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(dependency, operation):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def upstream_labels(url):
+    """
+    Returns (dependency, operation) labels for an outgoing HTTP request:
+    the upstream service and, for the Stats API, the endpoint family.
+    """
+    parts = urlsplit(url)
+    dependency = UPSTREAM_HOSTS.get(parts.hostname, parts.hostname or 'http')
+    if dependency == 'stats_api':
+        path = parts.path.split('/api/v1/', 1)[-1]
+        return dependency, path.split('/', 1)[0] or 'root'
+    return dependency, 'GET'
+
+
+def register_counters(source):
+    """
+    Adds a callable returning {(metric, labels dict items): value} to the
+    counters exported by /metrics.
+    """
+    _counter_sources.append(source)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _collect():
+    """
+    Returns this process's (histograms, counters).
+    """
+    with _histograms_lock:
+        histograms = {key: list(value) for key, value in _histograms.items()}
+    counters = {}
+    for source in _counter_sources:
+        try:
+            counters.update(source())
+        except Exception as e:
+            logger.error("Error collecting metrics: %s", e)
+    return histograms, counters
+
+
+def _reset_histograms():
+    global _histograms_lock
+    # What the master recorded while preloading would otherwise be counted
+    # once by every worker it was copied into
+    _histograms.clear()
+    _histograms_lock = threading.Lock()
+
+
+if METRICS_DIR:
+    os.register_at_fork(after_in_child=_reset_histograms)
+
+
+def _metrics_path(pid):
+    return os.path.join(METRICS_DIR, f'{pid}.json')
+
+
+def write_metrics():
+    """
+    Writes this process's metrics to its file in METRICS_DIR.
+    """
+    histograms, counters = _collect()
+    data = {
+        'histograms': [[metric, labels, values]
+                       for (metric, labels), values in histograms.items()],
+        'counters': [[metric, list(labels), value]
+                     for (metric, labels), value in counters.items()]
+    }
+    path = _metrics_path(os.getpid())
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def _read_all_metrics():
+    """
+    Adds up the metrics files of every worker, this one included.
+    """
+    write_metrics()
+    histograms, counters = {}, {}
+    for path in glob.glob(_metrics_path('*')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Error reading metrics from %s: %s", path, e)
+            continue
+        for metric, labels, values in data['histograms']:
+            key = (metric, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            histograms[key] = [
+                a + b for a, b in zip(total, values, strict=True)
+            ]
+        for metric, labels, value in data['counters']:
+            key = (metric, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _metrics_writer_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            write_metrics()
+        except Exception as e:
+            logger.error("Error writing metrics: %s", e)
+
+
+def start_metrics_writer():
+    """
+    Starts the daemon thread that keeps this worker's metrics file up to
+    date, when METRICS_DIR is set. Call it after forking.
+    """
+    global _writer
+    if not METRICS_DIR or _writer is not None:
+        return _writer
+    _writer = threading.Thread(target=_metrics_writer_loop,
+                               name='metrics-writer',
+                               daemon=True)
+    _writer.start()
+    atexit.register(write_metrics)
+    return _writer
+
+
+def clear_metrics_dir():
+    """
+    Removes the metrics files left in METRICS_DIR by an earlier run.
+    """
+    for path in glob.glob(_metrics_path('*')):
+        os.remove(path)
+
+
+def render_metrics():
+    """
+    Renders every histogram and registered counter in the Prometheus text
+    exposition format, summed over all workers when METRICS_DIR is set.
+    """
+    histograms, counters = _read_all_metrics() if METRICS_DIR else _collect()
+
+    lines, described = [], set()
+    for (metric, labels), histogram in sorted(histograms.items()):
+        if metric not in described:
+            described.add(metric)
+            lines.append(f"# HELP {metric} {HISTOGRAM_HELP.get(metric, '')}")
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram[:-2], strict=True):
+            cumulative += count
+            lines.append(f"{metric}_bucket"
+                         f"{_format_labels(labels + (('le', bound), ))} "
+                         f"{cumulative}")
+        lines.append(f"{metric}_bucket"
+                     f"{_format_labels(labels + (('le', '+Inf'), ))} "
+                     f"{histogram[-1]}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {histogram[-2]}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {histogram[-1]}")
+
+    for (metric, labels), value in sorted(counters.items()):
+        if metric not in described:
+            described.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.spans = defaultdict(float)
+    _request_spans.set(g.spans)
+
+
+def _record_request(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe('http_request_duration_seconds',
+            elapsed,
+            route=route,
+            method=request.method,
+            status=response.status_code)
+
+    with _spans_lock:
+        spans = dict(g.get('spans', {}))
+    response.headers['Server-Timing'] = ', '.join(
+        [f"{name};dur={seconds * 1000:.1f}"
+         for name, seconds in spans.items()] +
+        [f"total;dur={elapsed * 1000:.1f}"])
+    return response
+
+
+def _end_request(exc):
+    # Spans from later work on this thread don't belong to the request
+    _request_spans.set(None)
+
+
+def _start_template_timer(sender, template, context, **extra):
+    g.template_start = time.perf_counter()
+
+
+def _record_template(sender, template, context, **extra):
+    start = g.pop('template_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    observe('dependency_duration_seconds',
+            elapsed,
+            dependency='template',
+            operation=template.name or 'string')
+    _add_span('template', elapsed)
+
+
+def init_metrics(app):
+    """
+    Times every request and template render of the app, and serves the
+    collected metrics at /metrics.
+    """
+    app.before_request(_start_request_timer)
+    app.after_request(_record_request)
+    app.teardown_request(_end_request)
+    before_render_template.connect(_start_template_timer, app)
+    template_rendered.connect(_record_template, app)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(),
+                        mimetype='text/plain; version=0.0.4')
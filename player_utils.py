@@ -0,0 +1,289 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from fuzzywuzzy import fuzz
+
+from http_utils import http_get
+
+logger = logging.getLogger(__name__)
+
+PLAYER_DIRECTORY_URL = "https://statsapi.mlb.com/api/v1/sports/1/players"
+# How long a fetched directory is served before it is refreshed
+PLAYER_DIRECTORY_TTL = int(os.environ.get('PLAYER_DIRECTORY_TTL', 6 * 3600))
+NAME_SUFFIXES = ['jr', 'sr', 'ii', 'iii']
+# How many players are fuzzy-scored per search
+MAX_CANDIDATES = 25
+MIN_MATCH_SCORE = 70
+
+TEAMS_URL = "https://statsapi.mlb.com/api/v1/teams"
+ROSTER_URL = "https://statsapi.mlb.com/api/v1/teams/{team_id}/roster"
+# How long a league-wide roster index is served before it is rebuilt
+ROSTER_INDEX_TTL = int(os.environ.get('ROSTER_INDEX_TTL', 12 * 3600))
+ROSTER_WORKERS = 10
+# Backoff before rebuilding an index that is missing teams (or couldn't be
+# built at all), doubled on every failed rebuild up to ROSTER_INDEX_TTL
+ROSTER_RETRY_DELAY = int(os.environ.get('ROSTER_RETRY_DELAY', 60))
+
+# Current directory with its precomputed names and candidate indexes.
+# Rebound as a whole when refreshed.
+_directory = {
+    'people': [],
+    'names': [],
+    'base_names': [],
+    'trigrams': {},
+    'last_names': {},
+    'loaded_at': 0
+}
+_directory_lock = threading.Lock()
+
+# Roster indexes by season: {'players': {player_id: (team_id, team_name)},
+# 'failed_teams': [...], 'loaded_at': ..., 'retry_delay': ...}
+_roster_indexes = {}
+_roster_locks = {}
+
+
+def clean_player_name(name):
+    return name.lower().replace('.', '').strip()
+
+
+def base_player_name(full_name):
+    """
+    Returns a cleaned full name without a Jr./Sr. style suffix.
+    """
+    name_parts = full_name.split()
+    if len(name_parts) > 2 and name_parts[-1] in NAME_SUFFIXES:
+        return ' '.join(name_parts[:-1])
+    return full_name
+
+
+def name_trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_player_directory(people):
+    """
+    Precomputes the cleaned names of every player along with a trigram index
+    and last-name buckets, used to pick fuzzy match candidates.
+    """
+    names = [clean_player_name(person['fullName']) for person in people]
+    base_names = [base_player_name(name) for name in names]
+
+    trigrams, last_names = {}, {}
+    for i, (name, base_name) in enumerate(zip(names, base_names, strict=True)):
+        for trigram in name_trigrams(name) | name_trigrams(base_name):
+            trigrams.setdefault(trigram, []).append(i)
+        if base_name:
+            last_names.setdefault(base_name.split()[-1], []).append(i)
+
+    return {
+        'people': people,
+        'names': names,
+        'base_names': base_names,
+        'trigrams': trigrams,
+        'last_names': last_names,
+        'loaded_at': time.time()
+    }
+
+
+def load_player_directory():
+    """
+    Fetches the active player list from the Stats API and makes it current.
+    """
+    global _directory
+    response = http_get(PLAYER_DIRECTORY_URL)
+    response.raise_for_status()
+    _directory = build_player_directory(response.json().get('people', []))
+    logger.info("Loaded player directory with %s players",
+                len(_directory['people']))
+    return _directory
+
+
+def _refresh_player_directory():
+    try:
+        load_player_directory()
+    except requests.exceptions.RequestException as e:
+        logger.error("Error refreshing player directory: %s", e)
+    finally:
+        _directory_lock.release()
+
+
+def get_player_directory():
+    """
+    Returns the cached player directory. Only the very first call waits for
+    the Stats API; once the TTL has passed the stale copy keeps being served
+    while a background thread fetches a new one.
+    """
+    directory = _directory
+    if not directory['people']:
+        with _directory_lock:
+            if not _directory['people']:
+                return load_player_directory()
+            return _directory
+
+    if (time.time() - directory['loaded_at'] > PLAYER_DIRECTORY_TTL
+            and _directory_lock.acquire(blocking=False)):
+        threading.Thread(target=_refresh_player_directory,
+                         name='player-directory-refresher',
+                         daemon=True).start()
+    return directory
+
+
+def find_candidates(directory, clean_name):
+    """
+    Returns the indexes of the players whose names share the most trigrams
+    with the query, plus everyone with the query's last name.
+    """
+    overlaps = Counter()
+    for trigram in name_trigrams(clean_name):
+        overlaps.update(directory['trigrams'].get(trigram, ()))
+
+    candidates = {i for i, _ in overlaps.most_common(MAX_CANDIDATES)}
+    name_parts = base_player_name(clean_name).split()
+    if name_parts:
+        candidates.update(directory['last_names'].get(name_parts[-1], ()))
+    return candidates
+
+
+def search_player_directory(player_name):
+    """
+    Fuzzy matches a name against the player directory, with and without
+    name suffixes. Returns the best matching person, or None.
+    """
+    directory = get_player_directory()
+    clean_name = clean_player_name(player_name)
+
+    best_match, best_score = None, MIN_MATCH_SCORE
+    for i in sorted(find_candidates(directory, clean_name)):
+        score = max(fuzz.ratio(clean_name, directory['names'][i]),
+                    fuzz.ratio(clean_name, directory['base_names'][i]))
+        if score > best_score:
+            best_match, best_score = directory['people'][i], score
+    return best_match
+
+
+def _fetch_roster(team_id, season):
+    response = http_get(ROSTER_URL.format(team_id=team_id),
+                        params={'season': season})
+    response.raise_for_status()
+    return response.json().get('roster', [])
+
+
+def build_roster_index(season, previous=None):
+    """
+    Maps every rostered MLB player to their team for a season, using one
+    /teams call for the team names and fetching all rosters concurrently.
+    A team whose roster can't be fetched is left out (or keeps its players
+    from the previous index) and listed in failed_teams.
+    """
+    response = http_get(TEAMS_URL, params={'sportId': 1, 'season': season})
+    response.raise_for_status()
+    team_names = {
+        team['id']: team['name']
+        for team in response.json().get('teams', [])
+    }
+
+    with ThreadPoolExecutor(max_workers=ROSTER_WORKERS) as pool:
+        futures = {
+            team_id: pool.submit(_fetch_roster, team_id, season)
+            for team_id in team_names
+        }
+
+    players = {}
+    failed_teams = []
+    for team_id, future in futures.items():
+        try:
+            roster = future.result()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Error fetching %s roster for team %s: %s", season,
+                         team_id, e)
+            failed_teams.append(team_id)
+            continue
+        for entry in roster:
+            player_id = entry.get('person', {}).get('id')
+            if player_id:
+                players[str(player_id)] = (team_id, team_names[team_id])
+
+    if failed_teams and previous:
+        for player_id, team in previous['players'].items():
+            if team[0] in failed_teams:
+                players.setdefault(player_id, team)
+
+    logger.info("Built %s roster index with %d players on %d teams (%d failed)",
+                season, len(players), len(team_names), len(failed_teams))
+    return {
+        'players': players,
+        'failed_teams': failed_teams,
+        'loaded_at': time.time(),
+        'retry_delay': _next_retry_delay(previous) if failed_teams else None
+    }
+
+
+def _next_retry_delay(previous):
+    if previous and previous.get('retry_delay'):
+        return min(previous['retry_delay'] * 2, ROSTER_INDEX_TTL)
+    return ROSTER_RETRY_DELAY
+
+
+def load_roster_index(season):
+    """
+    Builds and stores the roster index for a season. If it can't be built at
+    all the previous index is kept, or an empty one stored, and retried
+    after a backoff instead of on the next lookup.
+    """
+    previous = _roster_indexes.get(season)
+    try:
+        _roster_indexes[season] = build_roster_index(season, previous)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error("Error building %s roster index: %s", season, e)
+        index = dict(previous or {'players': {}, 'failed_teams': []},
+                     loaded_at=time.time(),
+                     retry_delay=_next_retry_delay(previous))
+        _roster_indexes[season] = index
+    return _roster_indexes[season]
+
+
+def _refresh_roster_index(season):
+    try:
+        load_roster_index(season)
+    finally:
+        _roster_locks[season].release()
+
+
+def _roster_index_expired(index):
+    max_age = index['retry_delay'] or ROSTER_INDEX_TTL
+    return time.time() - index['loaded_at'] > max_age
+
+
+def get_roster_index(season):
+    """
+    Returns the cached roster index for a season, building it on first use
+    and rebuilding it in the background once ROSTER_INDEX_TTL has passed, or
+    sooner, with backoff, if it is missing teams.
+    """
+    lock = _roster_locks.setdefault(season, threading.Lock())
+    index = _roster_indexes.get(season)
+    if index is None:
+        with lock:
+            if season not in _roster_indexes:
+                return load_roster_index(season)
+            return _roster_indexes[season]
+
+    if _roster_index_expired(index) and lock.acquire(blocking=False):
+        threading.Thread(target=_refresh_roster_index,
+                         args=(season, ),
+                         name='roster-index-refresher',
+                         daemon=True).start()
+    return index
+
+
+def find_player_team(player_id, season):
+    """
+    Returns (team_id, team_name) for a rostered player, or None.
+    """
+    return get_roster_index(season)['players'].get(str(player_id))
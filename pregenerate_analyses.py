@@ -0,0 +1,140 @@
+"""
+Generates Gemini analyses for home runs ahead of time and stores them in
+analysis_cache, so viewers don't wait for a cold generation.
+
+    python pregenerate_analyses.py --players favorites --workers 4 --rate 30
+
+Home runs that already have a cached analysis are skipped, so an
+interrupted run picks up where it stopped when started again.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import main
+from cache_utils import cache_get
+from gemini_utils import get_all_home_runs
+from home_run_utils import get_batter_names
+from startup_utils import wait_until_ready
+
+_rate_lock = threading.Lock()
+_next_request_at = 0.0
+
+
+def wait_for_rate_limit(requests_per_minute):
+    """
+    Blocks until the next Gemini request may start, spacing requests evenly
+    across all worker threads.
+    """
+    global _next_request_at
+    with _rate_lock:
+        now = time.monotonic()
+        start_at = max(now, _next_request_at)
+        _next_request_at = start_at + 60.0 / requests_per_minute
+    time.sleep(start_at - now)
+
+
+def favorite_players():
+    """
+    Returns (player_id, name) for every player in favorite_players.
+    """
+    players = []
+    for doc in main.db.collection('favorite_players').stream():
+        player_data = doc.to_dict()
+        players.append((player_data.get('id', doc.id), player_data['name']))
+    return players
+
+
+def dataset_players():
+    """
+    Returns (player_id, name) for every batter in the home run dataset that
+    can be matched to an MLB player.
+    """
+    players = []
+    for name in get_batter_names():
+        player_id = main.get_player_id(name)
+        if player_id:
+            players.append((player_id, name))
+        else:
+            print(f"Skipping {name}: no matching MLB player")
+    return players
+
+
+def pending_jobs(players, limit=None):
+    """
+    Lists the (player_id, player_name, video_index, homer) of every home run
+    that has no cached analysis yet.
+    """
+    jobs, seen = [], set()
+    for player_id, player_name in players:
+        for video_index, homer in enumerate(get_all_home_runs(player_name)):
+            if limit is not None and len(jobs) >= limit:
+                return jobs
+            # Analyses are keyed by home run, so each is generated once even
+            # if several players' lookups include it
+            analysis_cache_key = main.get_analysis_cache_key(homer)
+            if analysis_cache_key in seen:
+                continue
+            seen.add(analysis_cache_key)
+            if not cache_get('analysis_cache', analysis_cache_key):
+                jobs.append((player_id, player_name, video_index, homer))
+    return jobs
+
+
+def run_job(job, requests_per_minute):
+    player_id, player_name, video_index, homer = job
+    wait_for_rate_limit(requests_per_minute)
+    result = main.generate_analysis(player_id, player_name, video_index,
+                                    homer)
+    return bool(result) and not result.get('error')
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description="Pre-generate home run analyses into analysis_cache")
+    parser.add_argument('--players',
+                        choices=['favorites', 'all'],
+                        default='favorites',
+                        help="favorited players only, or every batter in "
+                        "the home run dataset")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate',
+                        type=float,
+                        default=30,
+                        help="maximum Gemini requests per minute")
+    parser.add_argument('--limit',
+                        type=int,
+                        help="stop after this many home runs")
+    args = parser.parse_args()
+
+    # main connects Firestore and loads the dataset in the background
+    wait_until_ready('firebase', 'home_runs')
+    players = favorite_players(
+    ) if args.players == 'favorites' else dataset_players()
+    jobs = pending_jobs(players, args.limit)
+    print(f"{len(jobs)} home runs of {len(players)} players need analysis")
+
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(run_job, job, args.rate): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            player_id, player_name, video_index, _ = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"Error analyzing {player_name} #{video_index}: {e}")
+                ok = False
+            done += ok
+            failed += not ok
+            print(f"[{done + failed}/{len(jobs)}] {player_name} "
+                  f"#{video_index}: {'ok' if ok else 'failed'}")
+
+    print(f"Generated {done} analyses, {failed} failed")
+
+
+if __name__ == "__main__":
+    main_cli()
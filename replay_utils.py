@@ -0,0 +1,263 @@
+"""
+Record/replay store for HTTP responses, kept in a local SQLite file.
+
+HTTP_STORE_MODE selects how http_utils.http_get uses it:
+
+    off        every request goes to the network; the default unless
+               HTTP_STORE_PATH is set
+    immutable  responses that can never change (see IMMUTABLE_RULES) are
+               recorded and then served from disk, keeping at most
+               HTTP_STORE_MAX_ROWS of them; the default when HTTP_STORE_PATH
+               is set
+    record     every response is recorded, immutable or not
+    replay     every request is served from disk and a request that was
+               never recorded fails, for deterministic offline runs
+
+The store is only on by default when HTTP_STORE_PATH points it somewhere:
+on Cloud Run the local filesystem is held in memory, and the game data it
+would mostly hold is already cached in game_context.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+STORE_MODES = ('off', 'immutable', 'record', 'replay')
+STORE_MODE = os.environ.get(
+    'HTTP_STORE_MODE', 'immutable' if 'HTTP_STORE_PATH' in os.environ else 'off')
+STORE_PATH = os.environ.get('HTTP_STORE_PATH',
+                            os.path.join('data', 'http_store.sqlite'))
+# In immutable mode the oldest responses are evicted past this many
+STORE_MAX_ROWS = int(os.environ.get('HTTP_STORE_MAX_ROWS', 20000))
+
+# Headers describing the wire format of the original body, which the
+# stored (already decoded) body no longer has
+DROPPED_HEADERS = ('Content-Encoding', 'Content-Length', 'Transfer-Encoding')
+
+# One connection per thread; sqlite3 connections can't be shared
+_local = threading.local()
+_final_games = set()
+
+
+def _forget_connections():
+    # Nor used across a fork: a forked worker opens its own
+    global _local
+    _local = threading.local()
+
+
+os.register_at_fork(after_in_child=_forget_connections)
+
+
+class ReplayMiss(requests.exceptions.ConnectionError):
+    """
+    Raised in replay mode for a request that was never recorded.
+    """
+
+
+def _connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        os.makedirs(os.path.dirname(STORE_PATH) or '.', exist_ok=True)
+        connection = sqlite3.connect(STORE_PATH, timeout=10)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                immutable INTEGER NOT NULL,
+                recorded_at REAL NOT NULL
+            )''')
+        connection.execute('''
+            CREATE INDEX IF NOT EXISTS responses_recorded_at
+            ON responses (recorded_at)''')
+        connection.execute('''
+            CREATE TABLE IF NOT EXISTS final_games (
+                game_id TEXT PRIMARY KEY
+            )''')
+        connection.commit()
+        _local.connection = connection
+    return connection
+
+
+def request_url(url, params=None):
+    """
+    Returns the URL with params merged into its query string, sorted so
+    the same request always gets the same key.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + [(key, str(value))
+                                      for key, value in (params or {}).items()]
+    return parts._replace(query=urlencode(sorted(query))).geturl()
+
+
+def request_key(url):
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def _current_season():
+    return datetime.date.today().year
+
+
+def _is_final_game(game_id):
+    if game_id in _final_games:
+        return True
+    row = _connection().execute(
+        'SELECT 1 FROM final_games WHERE game_id = ?', (game_id, )).fetchone()
+    if row:
+        _final_games.add(game_id)
+    return bool(row)
+
+
+def _mark_final_game(game_id):
+    _final_games.add(game_id)
+    connection = _connection()
+    connection.execute('INSERT OR IGNORE INTO final_games VALUES (?)',
+                       (game_id, ))
+    connection.commit()
+
+
+def _final_schedule(match, query, data):
+    games = [
+        game for date in data.get('dates', [])
+        for game in date.get('games', [])
+    ]
+    if not games or 'gamePk' not in query:
+        return False
+    final = all(
+        game.get('status', {}).get('abstractGameState') == 'Final'
+        for game in games)
+    if final:
+        for game in games:
+            _mark_final_game(str(game.get('gamePk')))
+    return final
+
+
+def _final_game(match, query, data):
+    # A game's data is only frozen once its schedule entry said Final
+    # before this response was fetched
+    return _is_final_game(match.group(1))
+
+
+def _past_season(match, query, data):
+    season = query.get('season')
+    return bool(season and season.isdigit()
+                and int(season) < _current_season())
+
+
+def _retired_player(match, query, data):
+    people = data.get('people', [])
+    return bool(people) and people[0].get('active') is False
+
+
+# (path pattern, check) pairs for Stats API responses that never change.
+# A check gets the path match, the query and the parsed JSON body.
+IMMUTABLE_RULES = [
+    (re.compile(r'/api/v1/schedule$'), _final_schedule),
+    (re.compile(r'/api/v1/game/(\d+)/(boxscore|linescore)$'), _final_game),
+    (re.compile(r'/api/v1/teams(/\d+/roster)?$'), _past_season),
+    (re.compile(r'/api/v1/people/\d+$'), _retired_player),
+]
+
+
+def is_immutable(url, response):
+    """
+    Returns whether a successful Stats API response can be served from the
+    store forever.
+    """
+    if response.status_code != 200:
+        return False
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    for pattern, check in IMMUTABLE_RULES:
+        match = pattern.search(parts.path)
+        if match:
+            try:
+                return check(match, query, response.json())
+            except ValueError:
+                return False
+    return False
+
+
+def load_response(url, immutable_only):
+    query = 'SELECT status, headers, body FROM responses WHERE key = ?'
+    if immutable_only:
+        query += ' AND immutable = 1'
+    row = _connection().execute(query, (request_key(url), )).fetchone()
+    if row is None:
+        return None
+
+    status, headers, body = row
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(json.loads(headers))
+    response._content = body
+    response.url = url
+    response.encoding = 'utf-8'
+    return response
+
+
+def save_response(url, response, immutable):
+    connection = _connection()
+    connection.execute(
+        'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (request_key(url), url, response.status_code,
+         json.dumps({
+             name: value
+             for name, value in response.headers.items()
+             if name.title() not in DROPPED_HEADERS
+         }), response.content,
+         int(immutable), time.time()))
+    if STORE_MODE == 'immutable':
+        # Recorded sessions are kept whole; only the cache-like immutable
+        # store is bounded
+        connection.execute(
+            '''DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY recorded_at
+                LIMIT max((SELECT COUNT(*) FROM responses) - ?, 0))''',
+            (STORE_MAX_ROWS, ))
+    connection.commit()
+
+
+def stored_get(fetch, url, **kwargs):
+    """
+    Performs a GET through the store according to STORE_MODE, calling
+    fetch(url, **kwargs) for requests that have to go to the network.
+    """
+    if STORE_MODE not in STORE_MODES[1:]:
+        return fetch(url, **kwargs)
+
+    full_url = request_url(url, kwargs.get('params'))
+    try:
+        response = load_response(full_url, STORE_MODE == 'immutable')
+    except sqlite3.Error as e:
+        logger.error("Error reading HTTP store: %s", e)
+        return fetch(url, **kwargs)
+    if response is not None:
+        return response
+    if STORE_MODE == 'replay':
+        raise ReplayMiss(f"No recorded response for {full_url}")
+
+    response = fetch(url, **kwargs)
+    immutable = is_immutable(full_url, response)
+    # A 304 only means something next to the request's own validators
+    if response.status_code != 304 and (immutable
+                                        or STORE_MODE == 'record'):
+        try:
+            save_response(full_url, response, immutable)
+        except sqlite3.Error as e:
+            logger.error("Error writing HTTP store: %s", e)
+    return response
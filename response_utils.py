@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import os
+
+from flask import Response, request
+
+# Changes on every Cloud Run deploy, so template changes invalidate ETags
+APP_VERSION = os.environ.get('K_REVISION', 'dev')
+COMPRESSIBLE_TYPES = ('text/html', 'application/json', 'text/css',
+                      'text/javascript', 'application/javascript')
+# Smaller bodies aren't worth the CPU
+MIN_COMPRESS_SIZE = 500
+GZIP_LEVEL = 6
+
+# Cache-Control values for the dynamic routes
+STATS_CACHE_CONTROL = 'public, max-age=300, stale-while-revalidate=3600'
+# /video and /api/analysis address a home run by its position in the
+# player's list, which shifts when the dataset reloads, so caches have to
+# check the ETag every time rather than serve another home run's page
+VIDEO_CACHE_CONTROL = 'public, no-cache'
+ANALYSIS_CACHE_CONTROL = 'public, no-cache'
+
+
+def make_etag(*parts):
+    """
+    Builds a strong ETag from the versions of the data a response renders.
+    """
+    return hashlib.sha1(
+        json.dumps([APP_VERSION, *parts], sort_keys=True,
+                   default=str).encode()).hexdigest()
+
+
+def is_not_modified(etag):
+    """
+    Returns whether the request's If-None-Match already has this ETag, in
+    any of its content encodings.
+    """
+    if_none_match = request.if_none_match
+    return if_none_match.star_tag or any(
+        tag.split('-')[0] == etag for tag in if_none_match.as_set())
+
+
+def not_modified(etag, cache_control):
+    """
+    Returns a 304 carrying the ETag the client sent, which names the encoding
+    of its cached copy.
+    """
+    matched = [
+        tag for tag in request.if_none_match.as_set()
+        if tag.split('-')[0] == etag
+    ]
+    response = Response(status=304)
+    return cache_response(response, matched[0] if matched else etag,
+                          cache_control)
+
+
+def cache_response(response, etag, cache_control):
+    """
+    Sets a response's ETag and Cache-Control headers.
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _accepted_encoding():
+    accepted = request.accept_encodings
+    if accepted['br']:
+        try:
+            import brotli  # noqa: F401
+            return 'br'
+        except ImportError:
+            pass
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """
+    after_request hook that gzip (or brotli, when installed) compresses HTML,
+    JSON, CSS and JavaScript bodies. Streamed and file responses are left
+    alone.
+    """
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding()
+    body = response.get_data()
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    if encoding == 'br':
+        import brotli
+        body = brotli.compress(body)
+    else:
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+
+    # A strong ETag identifies one representation, so the encoded body
+    # gets its own
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
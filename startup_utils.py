@@ -0,0 +1,145 @@
+import functools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request waits for a component that is still warming up before
+# it is answered with a 503
+READY_WAIT = float(os.environ.get('STARTUP_READY_WAIT', 5))
+# Backoff between attempts of a failed startup step, doubled up to the max
+RETRY_DELAY = 1
+MAX_RETRY_DELAY = 60
+# Sent with 503s while warming up
+RETRY_AFTER = '5'
+# Set by gunicorn.conf.py when the app is preloaded: threads don't survive
+# a fork, so the steps are started in each worker by start_deferred
+DEFERRED = os.environ.get('STARTUP_DEFERRED', '') not in ('', '0')
+
+# Status of each component being initialized, by name
+_components = {}
+_steps = {}
+_started_at = None
+
+
+def _run_step(name, step):
+    component = _components[name]
+    delay = RETRY_DELAY
+    while True:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            component['error'] = str(e)
+            component['attempts'] += 1
+            logger.error("Error initializing %s, retrying in %ss: %s", name,
+                         delay, e)
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+            continue
+        component['seconds'] = round(time.perf_counter() - start, 3)
+        component['error'] = None
+        component['ready'].set()
+        logger.info("Initialized %s in %.2fs", name, component['seconds'])
+        return
+
+
+def run_startup(steps):
+    """
+    Runs each startup step, a {component: function} dict, on its own
+    background thread, retrying failed steps with backoff. Returns at once;
+    see is_ready and wait_until_ready. With DEFERRED set the steps only run
+    once start_deferred is called.
+    """
+    for name in steps:
+        _components[name] = {
+            'ready': threading.Event(),
+            'error': None,
+            'attempts': 0,
+            'seconds': None
+        }
+    _steps.update(steps)
+    if not DEFERRED:
+        start_deferred()
+
+
+def start_deferred():
+    """
+    Starts the startup steps given to run_startup, in the calling process.
+    """
+    global _started_at
+    _started_at = time.time()
+    for name, step in _steps.items():
+        threading.Thread(target=_run_step,
+                         args=(name, step),
+                         name=f'startup-{name}',
+                         daemon=True).start()
+
+
+def is_ready(*names):
+    """
+    Returns whether the given components (all of them if none are given)
+    have finished initializing.
+    """
+    return all(_components[name]['ready'].is_set()
+               for name in names or _components)
+
+
+def wait_until_ready(*names, timeout=None):
+    """
+    Waits for the given components (all of them if none are given) to
+    finish initializing. Returns False if timeout seconds pass first.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for name in names or list(_components):
+        remaining = None if deadline is None else max(
+            deadline - time.monotonic(), 0)
+        if not _components[name]['ready'].wait(remaining):
+            return False
+    return True
+
+
+def readiness():
+    """
+    Returns the startup status of every component, for the readiness
+    endpoint.
+    """
+    components = {
+        name: {
+            'ready': component['ready'].is_set(),
+            'seconds': component['seconds'],
+            'attempts': component['attempts'],
+            'error': component['error'],
+        }
+        for name, component in _components.items()
+    }
+    return {
+        'ready': is_ready(),
+        'uptime': round(time.time() - _started_at, 3) if _started_at else 0,
+        'components': components
+    }
+
+
+def requires(*names):
+    """
+    Decorates a route that needs the given components: while they are
+    still warming up it waits up to READY_WAIT seconds for them, then
+    answers with a 503 and Retry-After instead of failing.
+    """
+
+    def decorator(view):
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not is_ready(*names) and not wait_until_ready(
+                    *names, timeout=READY_WAIT):
+                return ("Warming up, please try again shortly", 503, {
+                    'Retry-After': RETRY_AFTER
+                })
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -37,15 +37,7 @@ function loadStats(playerId, playerName) {
   `;
   document.getElementById("sentimentModal").style.display = "block";
 
-  fetch(`/stats/${playerId}`)
-    .then(response => {
-      window.location.href = `/stats/${playerId}`;
-    })
-    .catch(error => {
-      console.error('Error:', error);
-      document.getElementById("sentimentModal").style.display = "none";
-      alert('Error loading stats. Please try again.');
-    });
+  window.location.href = `/stats/${playerId}`;
 }
 
 function loadVideo(playerId, playerName) {
@@ -64,6 +56,8 @@ function loadVideo(playerId, playerName) {
         alert(`No home run videos found in the archive for ${playerName}`);
         return;
       }
+      // The page was just fetched with a cacheable response, so the
+      // navigation is served from the browser cache or revalidated with a 304
       window.location.href = `/video/${playerId}`;
     })
     .catch(error => {
@@ -111,19 +105,6 @@ function loadNextVideo(playerId, videoIndex) {
     if (loader) {
         loader.style.display = 'block';
     }
-    const analysisUrl = `/api/analysis/${playerId}/${videoIndex}`;
-
-    fetch(analysisUrl)
-        .then(response => response.json())
-        .then(data => {
-            if (data.error) {
-                console.error('Error loading analysis:', data.error);
-            } else {
-                window.location.href = `/video/${playerId}/${videoIndex}`;
-            }
-        })
-        .catch(error => {
-            console.error('Error loading analysis:', error);
-            window.location.href = `/video/${playerId}/${videoIndex}`;
-        });
-}
\ No newline at end of file
+    // The video page streams its own analysis, so navigate right away
+    window.location.href = `/video/${playerId}/${videoIndex}`;
+}
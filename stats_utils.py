@@ -0,0 +1,120 @@
+import datetime
+import hashlib
+import json
+import os
+import time
+
+from cache_utils import cache_get, cache_set, cache_update
+from http_utils import stats_api_get
+
+STAT_GROUPS = ['hitting', 'pitching', 'fielding']
+# Full history, fetched once per player
+FULL_STATS_HYDRATE = ("stats(group=[hitting,pitching,fielding],"
+                      "type=[career,yearByYear])")
+# Just what the current season can change: its splits and the career totals
+CURRENT_STATS_HYDRATE = ("stats(group=[hitting,pitching,fielding],"
+                         "type=[career,season],season={season})")
+# How long the current season's stats are served before being refetched
+CURRENT_SEASON_TTL = int(os.environ.get('CURRENT_SEASON_TTL', 6 * 3600))
+
+
+def current_season():
+    return str(datetime.date.today().year)
+
+
+def empty_stats():
+    return {
+        'career': {group: {} for group in STAT_GROUPS},
+        'vsplayer': {
+            'total': {},
+            'splits': []
+        }
+    }
+
+
+def fetch_stat_groups(player_id, hydrate):
+    response = stats_api_get(f"/people/{player_id}",
+                             params={'hydrate': hydrate})
+    response.raise_for_status()
+    people = response.json().get('people', [])
+    return people[0].get('stats', []) if people else []
+
+
+def merge_stat_groups(stats_by_year, stat_groups):
+    """
+    Folds Stats API stat groups into stats_by_year. Career groups replace
+    the career totals; yearByYear and season splits replace the seasons
+    they cover, so past seasons are left as they are.
+    """
+    for stat_group in stat_groups:
+        group = stat_group.get('group', {}).get('displayName', '').lower()
+        type_name = stat_group.get('type', {}).get('displayName', '')
+        if group not in STAT_GROUPS:
+            continue
+
+        career = stats_by_year['career'][group]
+        splits = stat_group.get('splits', [])
+        if type_name == 'career':
+            split = splits[0] if splits else {}
+            for field in ('stat', 'team', 'league', 'position'):
+                career[field] = split.get(field, {})
+        elif type_name in ('yearByYear', 'season'):
+            updated = {split.get('season') for split in splits}
+            career['seasons'] = [
+                split for split in career.get('seasons', [])
+                if split.get('season') not in updated
+            ] + splits
+    return stats_by_year
+
+
+def content_hash(stats_by_year):
+    return hashlib.sha1(
+        json.dumps(stats_by_year, sort_keys=True,
+                   default=str).encode()).hexdigest()
+
+
+def get_player_stats(player_id, player_name):
+    """
+    Returns a player's stats from player_stats, fetching the full history on
+    the first request. Completed seasons never change, so once the current
+    season is older than CURRENT_SEASON_TTL only it and the career totals
+    are refetched. Once a new season starts the full history is fetched
+    again, as the cached copy of the season that just ended was taken while
+    it was still in progress. The document is only rewritten when the stats
+    changed.
+    """
+    player_id = str(player_id)
+    season = current_season()
+    cached = cache_get('player_stats', player_id)
+
+    if cached and 'content_hash' in cached and cached.get('season') == season:
+        age = time.time() - cached.get('refreshed_at', 0)
+        if age < CURRENT_SEASON_TTL:
+            return cached['stats']
+
+        stats_by_year = merge_stat_groups(
+            cached['stats'],
+            fetch_stat_groups(player_id,
+                              CURRENT_STATS_HYDRATE.format(season=season)))
+    else:
+        stats_by_year = merge_stat_groups(
+            empty_stats(), fetch_stat_groups(player_id, FULL_STATS_HYDRATE))
+
+    stats_hash = content_hash(stats_by_year)
+    if cached and cached.get('content_hash') == stats_hash:
+        # Only note that the current season was checked
+        cache_update('player_stats', player_id, {
+            'season': season,
+            'refreshed_at': time.time()
+        })
+    else:
+        cache_set(
+            'player_stats', player_id, {
+                'player_id': player_id,
+                'name': player_name,
+                'stats': stats_by_year,
+                'content_hash': stats_hash,
+                'season': season,
+                'refreshed_at': time.time()
+            })
+    return stats_by_year
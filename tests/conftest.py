@@ -0,0 +1,14 @@
+import pytest
+from firebase_admin import firestore
+
+from bench.fakes import FakeFirestore, transactional
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """
+    A dict-backed Firestore client, with firestore.transactional pointed at
+    its transactions.
+    """
+    monkeypatch.setattr(firestore, 'transactional', transactional)
+    return FakeFirestore()
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+import cache_utils
+from cache_utils import flight, single_flight
+
+
+def start_waiter(key, results):
+    """
+    Starts a thread that joins the flight for key and stores its result or
+    exception in results. Returns once the thread is waiting.
+    """
+    joined = threading.Event()
+
+    def wait():
+        def fn():
+            raise AssertionError("A waiter must not run the call")
+
+        joined.set()
+        try:
+            results['result'] = single_flight(key, fn)
+        except Exception as e:
+            results['error'] = e
+
+    thread = threading.Thread(target=wait)
+    coalesced = cache_utils._stats['single_flight']['coalesced']
+    thread.start()
+    joined.wait()
+    while cache_utils._stats['single_flight']['coalesced'] == coalesced:
+        thread.join(0.001)
+    return thread
+
+
+def test_waiters_share_the_leaders_result():
+    release = threading.Event()
+    results = {}
+
+    def leader():
+        release.wait()
+        return 'analysis'
+
+    thread = threading.Thread(
+        target=lambda: results.setdefault('leader', single_flight(
+            'shared', leader)))
+    thread.start()
+    while 'shared' not in cache_utils._in_flight:
+        thread.join(0.001)
+    waiter = start_waiter('shared', results)
+    release.set()
+    thread.join()
+    waiter.join()
+
+    assert results == {'leader': 'analysis', 'result': 'analysis'}
+    assert 'shared' not in cache_utils._in_flight
+
+
+def test_waiters_get_the_leaders_exception():
+    results = {}
+    with pytest.raises(ValueError), flight('failing') as (future, leader):
+        assert leader
+        waiter = start_waiter('failing', results)
+        raise ValueError("Gemini failed")
+    waiter.join()
+
+    assert isinstance(results['error'], ValueError)
+    assert 'failing' not in cache_utils._in_flight
+
+
+def test_leader_closed_without_a_result_fails_waiters_with_runtime_error():
+    results = {}
+
+    def stream():
+        with flight('stream') as (future, leader):
+            assert leader
+            yield 'chunk'
+            yield 'never sent'
+
+    generator = stream()
+    next(generator)
+    waiter = start_waiter('stream', results)
+    # What happens when a streaming client disconnects
+    generator.close()
+    waiter.join()
+
+    assert isinstance(results['error'], RuntimeError)
+    assert 'stream' not in cache_utils._in_flight
+
+
+def test_next_call_after_a_failure_leads_again():
+    with pytest.raises(ValueError):
+        single_flight('retry', lambda: (_ for _ in ()).throw(ValueError()))
+
+    assert single_flight('retry', lambda: 'ok') == 'ok'
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+import home_run_utils
+from home_run_utils import batter_name, find_home_runs, normalize_name
+
+
+@pytest.mark.parametrize('title, name', [
+    ("Aaron Judge homers (1) on a fly ball to left field.", "Aaron Judge"),
+    ("Mike Trout HR (3) on a line drive", "Mike Trout"),
+    ("Shohei Ohtani Grand Slam", "Shohei Ohtani"),
+    ("Giancarlo Stanton, Aaron Judge go back-to-back", "Giancarlo Stanton,"),
+    ("J.D. Martinez homers (2)", "J.D. Martinez"),
+    ("Ke'Bryan Hayes homers (1)", "Ke'Bryan Hayes"),
+    ("homers (1) on a fly ball", ""),
+])
+def test_batter_name(title, name):
+    assert batter_name(title) == name
+
+
+@pytest.mark.parametrize('name, normalized', [
+    ("Giancarlo Stanton,", "giancarlo stanton"),
+    ("Aaron Judge's", "aaron judge"),
+    ("Ronald Acuña Jr.", "ronald acuna jr"),
+    ("Mike Trout:", "mike trout"),
+])
+def test_normalize_name(name, normalized):
+    assert normalize_name(name) == normalized
+
+
+@pytest.fixture
+def dataset(monkeypatch):
+    titles = [
+        "Luis Robert homers (1) on a fly ball",
+        "Mike Trout HR (3) on a line drive",
+        "Giancarlo Stanton, Aaron Judge go back-to-back",
+    ]
+    df = pd.DataFrame({column: [None] * len(titles)
+                       for column in home_run_utils.HOME_RUN_COLUMNS})
+    df['title'] = titles
+    # set_home_runs_df rebinds _dataset, so this restores the previous one
+    monkeypatch.setattr(home_run_utils, '_dataset', home_run_utils._dataset)
+    home_run_utils.set_home_runs_df(df)
+
+
+@pytest.mark.parametrize('player_name, title', [
+    ("Luis Robert Jr.", "Luis Robert homers (1) on a fly ball"),
+    ("Mike Trout", "Mike Trout HR (3) on a line drive"),
+    ("Giancarlo Stanton", "Giancarlo Stanton, Aaron Judge go back-to-back"),
+])
+@pytest.mark.usefixtures('dataset')
+def test_find_home_runs(player_name, title):
+    assert [row['title'] for row in find_home_runs(player_name)] == [title]
+
+
+@pytest.mark.usefixtures('dataset')
+def test_find_home_runs_returns_none_for_missing_values():
+    row = find_home_runs("Mike Trout")[0]
+    assert row['video'] is None
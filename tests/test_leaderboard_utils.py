@@ -0,0 +1,66 @@
+import pytest
+
+import leaderboard_utils
+from leaderboard_utils import get_leaderboard, start_leaderboard_listener
+
+
+@pytest.fixture
+def leaderboard(fake_db, monkeypatch):
+    monkeypatch.setattr(leaderboard_utils, '_watch', None)
+    monkeypatch.setattr(leaderboard_utils, '_leaderboard', {
+        'players': None,
+        'positions': {},
+        'updated_at': 0
+    })
+    leaderboard_utils.init_leaderboard(fake_db)
+    # Few distinct vote counts, so most of the order comes from ties
+    for i in range(23):
+        player_id = str(100 + i)
+        fake_db.collection('favorite_players').document(player_id).set({
+            'id': player_id,
+            'votes': i % 3
+        })
+    return fake_db
+
+
+def page_ids(fetch_page):
+    ids, after = [], None
+    while True:
+        players, after = fetch_page(after)
+        ids += [player['id'] for player in players]
+        if after is None:
+            return ids
+
+
+@pytest.mark.usefixtures('leaderboard')
+def test_query_pages_cover_every_player_once():
+    ids = page_ids(lambda after: get_leaderboard(after, limit=5))
+    assert sorted(ids) == [str(100 + i) for i in range(23)]
+
+
+@pytest.mark.usefixtures('leaderboard')
+def test_memory_and_query_paths_page_alike(monkeypatch):
+    from_query = page_ids(lambda after: get_leaderboard(after, limit=5))
+    start_leaderboard_listener()
+    from_memory = page_ids(lambda after: get_leaderboard(after, limit=5))
+    assert from_memory == from_query
+
+    # A cursor handed out by one path continues on the other
+    snapshot = leaderboard_utils._leaderboard
+    mixed, after, use_query = [], None, False
+    while True:
+        monkeypatch.setattr(leaderboard_utils, '_leaderboard',
+                            {**snapshot, 'players': None}
+                            if use_query else snapshot)
+        players, after = get_leaderboard(after, limit=5)
+        mixed += [player['id'] for player in players]
+        use_query = not use_query
+        if after is None:
+            break
+    assert mixed == from_query
+
+
+@pytest.mark.usefixtures('leaderboard')
+def test_ties_are_ordered_by_descending_id():
+    players, _ = get_leaderboard(limit=3)
+    assert [player['id'] for player in players] == ['120', '117', '114']
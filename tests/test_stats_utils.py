@@ -0,0 +1,44 @@
+from stats_utils import empty_stats, merge_stat_groups
+
+
+def stat_group(group, type_name, splits):
+    return {
+        'group': {'displayName': group},
+        'type': {'displayName': type_name},
+        'splits': splits
+    }
+
+
+def test_career_group_replaces_the_career_totals():
+    stats = merge_stat_groups(empty_stats(), [
+        stat_group('hitting', 'career', [{'stat': {'homeRuns': 300}}])
+    ])
+
+    hitting = stats['career']['hitting']
+    assert hitting['stat'] == {'homeRuns': 300}
+    assert hitting['team'] == {}
+
+
+def test_season_splits_replace_only_the_seasons_they_cover():
+    stats = merge_stat_groups(empty_stats(), [
+        stat_group('hitting', 'yearByYear', [
+            {'season': '2023', 'stat': {'homeRuns': 37}},
+            {'season': '2024', 'stat': {'homeRuns': 10}},
+        ])
+    ])
+    stats = merge_stat_groups(stats, [
+        stat_group('hitting', 'season',
+                   [{'season': '2024', 'stat': {'homeRuns': 58}}])
+    ])
+
+    assert stats['career']['hitting']['seasons'] == [
+        {'season': '2023', 'stat': {'homeRuns': 37}},
+        {'season': '2024', 'stat': {'homeRuns': 58}},
+    ]
+
+
+def test_unknown_groups_are_ignored():
+    stats = merge_stat_groups(empty_stats(), [
+        stat_group('catching', 'career', [{'stat': {'passedBalls': 3}}])
+    ])
+    assert stats == empty_stats()
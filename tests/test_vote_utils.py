@@ -0,0 +1,41 @@
+import pytest
+
+import vote_utils
+
+
+@pytest.fixture
+def votes(fake_db, monkeypatch):
+    monkeypatch.setattr(vote_utils, 'WRITE_BEHIND', False)
+    monkeypatch.setattr(vote_utils, '_dirty', set())
+    monkeypatch.setattr(vote_utils, '_known_players', set())
+    vote_utils.init_votes(fake_db)
+    return fake_db
+
+
+def test_rollup_sums_shards_onto_the_votes_base(votes):
+    votes.collection('favorite_players').document('7').set({'votes': 3})
+    for _ in range(5):
+        vote_utils.record_vote('7')
+
+    assert vote_utils.rollup_votes('7') == 8
+    assert votes.docs['favorite_players/7'] == {'votes': 8, 'votes_base': 3}
+    # Later rollups keep the base instead of adding the total to it again
+    vote_utils.record_vote('7')
+    assert vote_utils.rollup_votes('7') == 9
+
+
+def test_rollup_of_a_missing_player(votes):
+    assert vote_utils.rollup_votes('8') is None
+    assert 'favorite_players/8' not in votes.docs
+
+
+def test_failed_rollups_stay_dirty(votes, monkeypatch):
+    votes.collection('favorite_players').document('7').set({'votes': 0})
+    vote_utils.record_vote('7')
+
+    def fail(_player_id):
+        raise RuntimeError("Firestore unavailable")
+
+    monkeypatch.setattr(vote_utils, 'rollup_votes', fail)
+    vote_utils.rollup_dirty_votes()
+    assert vote_utils._dirty == {'7'}
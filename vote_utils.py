@@ -0,0 +1,204 @@
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from metrics_utils import span
+
+logger = logging.getLogger(__name__)
+
+# Votes are spread over this many counter documents per player, so a burst
+# of votes for one player isn't limited by a single document's write rate
+NUM_SHARDS = int(os.environ.get('VOTE_SHARDS', 10))
+# When set, votes are buffered in memory and written as aggregated deltas
+# every VOTE_FLUSH_INTERVAL seconds instead of one write per vote
+WRITE_BEHIND = os.environ.get('VOTE_WRITE_BEHIND', '') not in ('', '0')
+FLUSH_INTERVAL = float(os.environ.get('VOTE_FLUSH_INTERVAL', 2))
+# How often shard counts are summed into the players' votes field
+ROLLUP_INTERVAL = float(os.environ.get('VOTE_ROLLUP_INTERVAL', 5))
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_SIZE = 500
+
+_db = None
+# player_id -> votes not yet written (write-behind mode only)
+_pending = Counter()
+# Players with shard writes that aren't reflected in their votes field yet
+_dirty = set()
+# Player IDs known to have a favorite_players document
+_known_players = set()
+_lock = threading.Lock()
+_writer = None
+
+
+def init_votes(db):
+    """
+    Sets the Firestore client votes are written to.
+    """
+    global _db
+    _db = db
+
+
+def _player_ref(player_id):
+    return _db.collection('favorite_players').document(str(player_id))
+
+
+def _shard_ref(player_id, shard=None):
+    if shard is None:
+        shard = random.randrange(NUM_SHARDS)
+    return _player_ref(player_id).collection('vote_shards').document(
+        str(shard))
+
+
+def player_exists(player_id):
+    """
+    Returns whether a player can be voted for. Players that exist are
+    remembered, so repeat votes skip the document read.
+    """
+    player_id = str(player_id)
+    if player_id in _known_players:
+        return True
+    with span('firestore', 'favorite_players.get'):
+        if not _player_ref(player_id).get().exists:
+            return False
+    _known_players.add(player_id)
+    return True
+
+
+def record_vote(player_id, count=1):
+    """
+    Adds votes for a player, either as an atomic increment of a random shard
+    or, in write-behind mode, to the in-memory buffer.
+    """
+    from firebase_admin import firestore
+
+    player_id = str(player_id)
+    if WRITE_BEHIND:
+        with _lock:
+            _pending[player_id] += count
+        return
+
+    with span('firestore', 'vote_shards.increment'):
+        _shard_ref(player_id).set({'count': firestore.Increment(count)},
+                                  merge=True)
+    with _lock:
+        _dirty.add(player_id)
+
+
+def flush_votes():
+    """
+    Writes the buffered votes as one shard increment per player, in batches.
+    Deltas whose batch fails go back into the buffer for the next flush.
+    """
+    global _pending
+    from firebase_admin import firestore
+
+    with _lock:
+        pending, _pending = _pending, Counter()
+    if not pending:
+        return 0
+
+    items = list(pending.items())
+    for start in range(0, len(items), MAX_BATCH_SIZE):
+        chunk = items[start:start + MAX_BATCH_SIZE]
+        batch = _db.batch()
+        for player_id, delta in chunk:
+            batch.set(_shard_ref(player_id),
+                      {'count': firestore.Increment(delta)},
+                      merge=True)
+        try:
+            with span('firestore', 'vote_shards.batch'):
+                batch.commit()
+        except Exception as e:
+            logger.error("Error flushing votes: %s", e)
+            with _lock:
+                _pending.update(dict(items[start:]))
+            break
+        with _lock:
+            _dirty.update(player_id for player_id, _ in chunk)
+    return sum(pending.values())
+
+
+def _rollup(transaction, player_ref):
+    player_doc = player_ref.get(transaction=transaction)
+    if not player_doc.exists:
+        return None
+
+    player_data = player_doc.to_dict()
+    # The first rollup of a player saved with the old read-modify-write
+    # route turns its votes into the base the shard counts are added to
+    votes_base = player_data.get('votes_base', player_data.get('votes', 0))
+    shard_total = sum(
+        shard.to_dict().get('count', 0) for shard in player_ref.collection(
+            'vote_shards').stream(transaction=transaction))
+    votes = votes_base + shard_total
+    transaction.update(player_ref, {'votes': votes, 'votes_base': votes_base})
+    return votes
+
+
+def rollup_votes(player_id):
+    """
+    Sums a player's vote shards into the votes field the leaderboard reads.
+    Votes counted before sharding are kept in votes_base. Runs in a
+    transaction, so a total summed from stale shards can't overwrite a
+    newer one written by another worker.
+    """
+    from firebase_admin import firestore
+
+    with span('firestore', 'vote_shards.rollup'):
+        return firestore.transactional(_rollup)(_db.transaction(),
+                                                _player_ref(player_id))
+
+
+def rollup_dirty_votes():
+    with _lock:
+        dirty = set(_dirty)
+        _dirty.clear()
+    for player_id in dirty:
+        try:
+            rollup_votes(player_id)
+        except Exception as e:
+            logger.error("Error rolling up votes for %s: %s", player_id, e)
+            with _lock:
+                _dirty.add(player_id)
+
+
+def _vote_writer_loop():
+    interval = FLUSH_INTERVAL if WRITE_BEHIND else ROLLUP_INTERVAL
+    next_rollup = time.monotonic() + ROLLUP_INTERVAL
+    while True:
+        time.sleep(interval)
+        try:
+            if WRITE_BEHIND:
+                flush_votes()
+            if time.monotonic() >= next_rollup:
+                next_rollup = time.monotonic() + ROLLUP_INTERVAL
+                rollup_dirty_votes()
+        except Exception as e:
+            logger.error("Error writing votes: %s", e)
+
+
+def _flush_at_exit():
+    try:
+        flush_votes()
+        rollup_dirty_votes()
+    except Exception as e:
+        logger.error("Error flushing votes at exit: %s", e)
+
+
+def start_vote_writer():
+    """
+    Starts the daemon thread that flushes buffered votes and keeps the
+    players' vote totals up to date.
+    """
+    global _writer
+    if _writer is not None:
+        return _writer
+    _writer = threading.Thread(target=_vote_writer_loop,
+                               name='vote-writer',
+                               daemon=True)
+    _writer.start()
+    atexit.register(_flush_at_exit)
+    return _writer